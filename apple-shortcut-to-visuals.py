@@ -1,28 +1,21 @@
 # Visualizing the shifts that I've worked at retail jobs
+#
+#   python apple-shortcut-to-visuals.py punch "Jul 25, 2025 at 4:30 PM\n..."   journals the shifts, a background flush writes them to the Google Sheet
+#   python apple-shortcut-to-visuals.py flush                                 punch journal --> Google Sheet, retrying until it's empty
+#   python apple-shortcut-to-visuals.py sync                                  (punch journal -->) Google Sheet --> database
+#   python apple-shortcut-to-visuals.py rebuild [--source "Name#Tab@2024"]      every sheet, loaded concurrently --> database
+#   python apple-shortcut-to-visuals.py plot [--out shifts.png]               chart from the database
+#   python apple-shortcut-to-visuals.py report [--period week]                totals from the database
+#   python apple-shortcut-to-visuals.py daemon                                keeps all of it warm for punch-client.py
+#   python apple-shortcut-to-visuals.py [--punchTimes ...]                    all of the above (the old behaviour)
+#
+# pandas, matplotlib, numpy and the Google libraries are only imported by the commands that use them,
+# so a punch from the Apple Shortcut doesn't wait for the plotting stack to load.
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.patches import Patch
 from datetime import datetime, date, time
 import argparse
-import numpy as np
-import os
-import copy 
-import sqlite3
-
-import gspread
+import sys
 from pathlib import Path
-from google.oauth2.service_account import Credentials
-from dotenv import load_dotenv
-
-# user made files 
-from utilities.workshift_data import SHEET_TO_WORKSHIFT_COLS, GOOGLE_SHEET_COL_TYPES
-from classes.shiftClass import WorkShift
-from classes.googleSheetClass import GoogleSheetManager
-from classes.shiftManagerClass import ShiftManager
-from utilities.necessary_data import NECESSARY_DATA
-from utilities.ut_functions import *
 
 
 
@@ -34,12 +27,54 @@ from utilities.ut_functions import *
 
 SCRIPTS_DIR = Path(__file__).parent
 
+# options every command takes: (flags, argparse kwargs)
+COMMON_OPTIONS = [
+    ('--csv', dict(type=str, default=SCRIPTS_DIR / 'sheet-closet/original-sheets/Staples Finances 2025.csv', help='CSV file name')),
+    ('--year', dict(type=str, default='2025', help='Year of data (2024 or 2025)')),
+    ('--pullSheetsFirst', dict(type=str, default=False, help='First pull from Google Sheets.')),
+    ('--sheetName', dict(type=str, default="Staples Finances 2025", help='Name of the Google Sheet.')),
+]
+OUT_OPTION = ('--out', dict(type=str, default='', help='Render the chart headless into this .png/.svg file instead of opening a window.'))
+
+
+def add_options(parser: argparse.ArgumentParser, options: list[tuple[str, dict]], topLevel: bool) -> None:
+    """
+    The top level parser holds the defaults. A command's parser takes the same options again
+    with no default (SUPPRESS), so they only count when given after the command and
+    never overwrite the ones given before it.
+    """
+    for flag, kwargs in options:
+        parser.add_argument(flag, **(kwargs if topLevel else {**kwargs, 'default': argparse.SUPPRESS}))
+
+
 parser = argparse.ArgumentParser(description="Visualize Staples shifts.")
-parser.add_argument('--csv', type=str, default=SCRIPTS_DIR / 'sheet-closet/original-sheets/Staples Finances 2025.csv', help='CSV file name')
-parser.add_argument('--year', type=str, default='2025', help='Year of data (2024 or 2025)')
-parser.add_argument('--punchTimes', type=str, default='', help='Punch times (Date Time or Time) seperated by new line character.')
-parser.add_argument('--pullSheetsFirst', type=str, default=False, help='First pull from Google Sheets.')
-parser.add_argument('--sheetName', type=str, default="Staples Finances 2025", help='Name of the Google Sheet.')
+add_options(parser, COMMON_OPTIONS + [OUT_OPTION], topLevel=True)
+parser.add_argument('--punchTimes', type=str, default='', help='Punch times (Date Time or Time) seperated by new line character, 2 or 4 per shift.')
+commands = parser.add_subparsers(dest='command', metavar='{punch,flush,sync,rebuild,plot,report,daemon}')
+
+punchParser = commands.add_parser('punch', help='Journal the punched shifts, they are written to the Google Sheet in the background.')
+punchParser.add_argument('punches', nargs='?', default='', help='Punch times seperated by new line character (read from stdin when left out).')
+
+flushParser = commands.add_parser('flush', help='Write the shifts waiting in the punch journal to the Google Sheet (retries with backoff).')
+
+syncParser = commands.add_parser('sync', help='Copy the rows that changed in the Google Sheet into the database.')
+
+rebuildParser = commands.add_parser('rebuild', help='Load every sheet of the history at once and save the shifts to the database.')
+rebuildParser.add_argument('--source', type=str, action='append', default=[], help='Spreadsheet name[#worksheet][@year], repeat for more sheets (default: the 2025 and 2023-24 sheets).')
+rebuildParser.add_argument('--workers', type=int, default=4, help='Sheets fetched at the same time.')
+
+plotParser = commands.add_parser('plot', help='Plot the shifts in the database.')
+add_options(plotParser, [OUT_OPTION], topLevel=False)
+plotParser.add_argument('--detail', type=str, default='auto', choices=('auto', 'day', 'week', 'month'), help='One bar per day, or binned per week / month.')
+
+reportParser = commands.add_parser('report', help='Print the hours and earnings totals from the database.')
+reportParser.add_argument('--period', type=str, default='pay_period', choices=('week', 'month', 'pay_period'), help='Totals per week, month or pay period.')
+
+daemonParser = commands.add_parser('daemon', help='Keep the sheet, the database and the imports warm and take punches from punch-client.py.')
+
+for commandParser in commands.choices.values():
+    add_options(commandParser, COMMON_OPTIONS, topLevel=False)
+
 args = parser.parse_args()
 
 
@@ -48,6 +83,7 @@ CURRENT_YEAR = args.year
 PUNCH_TIMES = args.punchTimes
 PULL_SHEETS_FIRST = args.pullSheetsFirst
 SHEET_NAME = args.sheetName
+OUT_PATH = args.out
 SHIFTS_SQL_DB_NAME = 'database.db'
 
 
@@ -66,31 +102,128 @@ SHIFTS_SQL_DB_NAME = 'database.db'
 
 
 def main():
-    if not checkYear():
-        exit()
-        
-        
-    # initialization
+    if args.command == 'punch':
+        punches = args.punches or ('' if sys.stdin.isatty() else sys.stdin.read())
+        if not punch(punches):
+            exit(1)
+
+    elif args.command == 'flush':
+        from classes.punchJournalClass import PunchJournal
+        PunchJournal().flush_until_empty(SHEET_NAME)
+
+    elif args.command == 'sync':
+        sync()
+
+    elif args.command == 'rebuild':
+        rebuild(args.source, maxWorkers=args.workers)
+
+    elif args.command == 'plot':
+        if not checkYear():
+            exit()
+        plot(outPath=OUT_PATH, detail=args.detail)
+
+    elif args.command == 'report':
+        report(period=args.period)
+
+    elif args.command == 'daemon':
+        from classes.punchDaemonClass import PunchDaemon
+        PunchDaemon(sheetName=SHEET_NAME).serve_forever()
+
+    else:
+        # no command: punch (if there are punches), sync and plot, like it always did
+        if not checkYear():
+            exit()
+
+        punched = True
+        if PUNCH_TIMES: 
+            # the sync right after flushes the journal itself
+            punched = punch(PUNCH_TIMES, background=False)
+        else: 
+            print(f"\nNo new shifts to parse")
+
+        sync()
+        plot(outPath=OUT_PATH)
+        if not punched:
+            exit(1)
+
+
+
+
+
+
+def punch(punches: str, background: bool=True) -> bool:
+    """
+    Punches --> shifts --> punch journal, on the local disk, so the punch is safe as soon as this returns.
+    A background flush (a detached process) then writes them to the Google Sheet, retrying if the network is down.
+    Only the punch parser and the journal are loaded: no numpy, pandas, matplotlib or Google libraries.
+    Returns False when a punch didn't make it into a shift (the punches are still saved in the journal).
+    """
+    from classes.punchJournalClass import PunchJournal, start_background_flush
+
+    if not punches.strip():
+        print(f"\nNo punches entered.")
+        return False
+
+    # any number of punches (one shift, or a few days of them)
+    with PunchJournal() as journal:
+        result = journal.append_punches(punches)
+
+    if result['shifts']:
+        print(f"\nJournaled {result['journaled']} shift(s) ({result['duplicates']} already journaled): {', '.join(str(shift) for shift in result['shifts'])}")
+        if background:
+            start_background_flush(SHEET_NAME)
+
+    if result['problems']:
+        print(f"\nNot every punch made it into a shift ({result['problems']}). The punches are saved in the punches table of {journal.journal_path}.")
+        return False
+    return True
+
+
+def sync():
+    """
+    Whatever is waiting in the punch journal goes to the sheet first, then
+    only the rows that changed since the last run reach the database (this includes new shifts).
+    """
+    from classes.googleSheetClass import GoogleSheetManager
+    from classes.shiftManagerClass import ShiftManager
+    from classes.punchJournalClass import PunchJournal, start_background_flush
+
     gglSheetManager = GoogleSheetManager(sheet_name=SHEET_NAME)
-    shiftMngr = ShiftManager()
-
-    # check if there's shifts to parse from arguments 
-    shifts = []
-    if PUNCH_TIMES: 
-        newShift = shiftMngr.parse_punches_into_shift(PUNCH_TIMES)
-        shifts = [newShift]
-
-        # update google sheet
-        gglSheetManager.add_new_shift_to_sheet(newShift)
-    else: 
-        print(f"\nNo new shifts to parse")
-    
-    
-    df = gglSheetManager.get_dataframe_of_sheet() # this does not account for the new shift(s) added
-    shifts += shiftMngr.collect_shifts_from_dataframe(df)
-    shiftMngr.save_shifts_to_db(shifts)
-
-    shiftMngr.plot(shifts, currentYear=CURRENT_YEAR)
+
+    with PunchJournal() as journal:
+        journal.flush_to_sheet(gglSheetManager)
+        if journal.counts()['pending']:
+            start_background_flush(SHEET_NAME)
+
+    ShiftManager().sync_sheet_to_db(gglSheetManager)
+
+
+def rebuild(sourceSpecs: list[str], maxWorkers: int=4):
+    """
+    The whole history: all the sheets fetched and parsed concurrently, merged without duplicates, saved to the db.
+    """
+    from classes.multiSheetLoaderClass import MultiSheetLoader, SHEET_SOURCES, parse_sheet_source
+    from classes.shiftManagerClass import ShiftManager
+
+    sources = [parse_sheet_source(spec) for spec in sourceSpecs] or SHEET_SOURCES
+    table = MultiSheetLoader(sources, maxWorkers=maxWorkers).load()
+    ShiftManager().save_shifts_to_db(table)
+
+
+def plot(outPath: str='', detail: str='auto'):
+    """
+    The plot only reads its own date range from the db
+    (with --out the chart is written to a file, and an unchanged chart comes straight from the cache)
+    """
+    from classes.shiftManagerClass import ShiftManager
+
+    ShiftManager().plot(currentYear=CURRENT_YEAR, outPath=outPath or None, detail=detail)
+
+
+def report(period: str='pay_period'):
+    from classes.shiftManagerClass import ShiftManager
+
+    ShiftManager().print_rollups(period)
 
 
 
@@ -1,6 +1,7 @@
 # google sheet class
 from typing import Dict
 import gspread
+from gspread.utils import rowcol_to_a1, a1_range_to_grid_range, ValueInputOption
 from pathlib import Path
 from google.oauth2.service_account import Credentials
 from dotenv import load_dotenv
@@ -9,24 +10,69 @@ from dotenv import load_dotenv
 from pathlib import Path
 from dotenv import load_dotenv
 import os 
-import pandas as pd
-from datetime import datetime, date, time
+import re
+import json
+import time as clock
+import threading
+from datetime import datetime, date, time, timedelta, timezone
 
 # user modules
 from utilities.workshift_data import *
 from classes.shiftClass import WorkShift
+from classes.sheetsSchedulerClass import SHEETS_SCHEDULER
 
 SCRIPTS_DIR = Path(__file__).parent.parent
 
+TIME_FORMATS = {
+    # strptime format : regex that recognises it (used to sniff a column's format)
+    "%H:%M:%S": re.compile(r"^\d{1,2}:\d{2}:\d{2}$"),
+    "%I:%M %p": re.compile(r"^\d{1,2}:\d{2} [AaPp][Mm]$"),
+    "%H:%M": re.compile(r"^\d{1,2}:\d{2}$"),
+}
+FORMAT_SNIFF_SAMPLE_SIZE = 50
+
+# the only columns that are downloaded: the ones the shifts are read from and written to, and the ones
+# get_dataframe_of_sheet parses. The rest of the sheet (formulas, totals, notes to self) is never fetched
+FETCH_COLUMNS = (*GOOGLE_SHEET_COL_TYPES, 'YEAR SELECTOR', 'time', 'hours')
+
+SNAPSHOT_DIR = SCRIPTS_DIR / '.cache' / 'sheets'
+SNAPSHOT_TTL_SECONDS = 5 * 60 # within this window the snapshot is used without even checking the revision
+
+SHEET_KEYS_PATH = SCRIPTS_DIR / '.cache' / 'sheet-keys.json'     # sheet name : spreadsheet key
+TOKEN_CACHE_PATH = SCRIPTS_DIR / '.cache' / 'google-token.json'  # the service account's access token, owner only
+TOKEN_MIN_LIFETIME_SECONDS = 5 * 60 # a cached token that expires sooner than this is fetched again
+
+# pandas is only imported by the methods that build a DataFrame (get_dataframe_of_sheet and its helpers),
+# writing shifts works on the plain values, so recording a punch never pays for it
+
+# every request to the API goes through SHEETS_SCHEDULER (rate limited to the quota, retried with backoff)
+
 
 
 
 
 
 class GoogleSheetManager:
-    def __init__(self, sheet_name: str):
+    def __init__(
+        self,
+        sheet_name: str,
+        snapshot_ttl: float=SNAPSHOT_TTL_SECONDS,
+        worksheet: str | None=None,
+        client: gspread.Client | None=None,
+        current_year: str='2025',
+    ):
+        """
+        worksheet is the tab's title (sheet1 when None), current_year is the year the sheet's
+        dates (which have no year) are labelled with. Pass a client from authorize_client()
+        to share one authorization between several managers.
+        """
         self._sheet_name = sheet_name
-        self._sheet = self.__initialize()
+        self._worksheet = worksheet
+        self._current_year = current_year
+        self._snapshot_ttl = snapshot_ttl
+        self._snapshot = None # {'revision': str | None, 'fetched_at': float, 'values': list[list[str]]}
+        self._spreadsheet = None
+        self._sheet = self.__initialize(client)
         
         
     @property
@@ -37,38 +83,49 @@ class GoogleSheetManager:
     def sheet(self):
         return self._sheet
 
+    @property
+    def spreadsheet(self):
+        return self._spreadsheet
+
+    @property
+    def worksheet(self):
+        return self._worksheet
+
+    @property
+    def current_year(self):
+        return self._current_year
+
+    @property
+    def snapshot_revision(self) -> str | None:
+        """
+        The revision the values in memory were downloaded at (None when unknown, e.g. after our own write).
+        """
+        return self._snapshot['revision'] if self._snapshot else None
+
         
         
         
         
         
-    def __initialize(self):
+    def __initialize(self, client: gspread.Client | None=None):
         print(f"Initializing Google Sheet \'{self.sheet_name}\"")
         print(f"The home dir is {SCRIPTS_DIR}")
         print()
 
         try: 
-            env_path = SCRIPTS_DIR / ".env"
-            load_dotenv(dotenv_path=env_path)  # automatically looks for .env in the scripts directory
-
-            creds_path = SCRIPTS_DIR / os.getenv("GOOGLE_SHEETS_CREDS_FILE")
-            
-            # Define the scopes
-            scopes = [
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive"
-            ]
-            
             # Authorize
-            creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
-            client = gspread.authorize(creds)
+            if client is None:
+                client = authorize_client()
 
             # -----------------------------
-            # Open sheet by name or URL
-            sheet = client.open(self.sheet_name).sheet1
+            # Open sheet by its key, looking the name up in Drive only the first time
+            self._spreadsheet = self.__open_spreadsheet(client)
+            if self._worksheet:
+                sheet = SHEETS_SCHEDULER.call('read', self._spreadsheet.worksheet, self._worksheet)
+            else:
+                sheet = SHEETS_SCHEDULER.call('read', lambda: self._spreadsheet.sheet1)
 
-            print(f"Successfully connected to sheet \"{self.sheet_name}\".")
-            print(f"Number of rows: {len(sheet.get_all_values())}")
+            print(f"Successfully connected to sheet \"{self.sheet_name}\"{f' ({self._worksheet})' if self._worksheet else ''}.")
 
             return sheet
 
@@ -78,34 +135,264 @@ class GoogleSheetManager:
             return None
 
 
+    def __open_spreadsheet(self, client: gspread.Client) -> gspread.Spreadsheet:
+        """
+        Opens the spreadsheet with open_by_key when its key is known: client.open is a Drive search by name
+        on top of that. The key is forgotten (and looked up again) once it stops opening a sheet with this name.
+        """
+        key = load_sheet_keys().get(self.sheet_name)
+        if key:
+            try:
+                spreadsheet = SHEETS_SCHEDULER.call('read', client.open_by_key, key)
+                if spreadsheet.title == self.sheet_name:
+                    return spreadsheet
+                print(f"The saved key of \"{self.sheet_name}\" now opens \"{spreadsheet.title}\", looking it up again.")
+            except (gspread.SpreadsheetNotFound, PermissionError):
+                print(f"The saved key of \"{self.sheet_name}\" no longer opens it, looking it up again.")
+            save_sheet_key(self.sheet_name, None)
+
+        spreadsheet = SHEETS_SCHEDULER.call('read', client.open, self.sheet_name)
+        save_sheet_key(self.sheet_name, spreadsheet.id)
+        return spreadsheet
+
+
 
 
 
         
 
-    def get_dataframe_of_sheet(self) -> pd.DataFrame:
+    def get_sheet_values(self, revision: str | None=None) -> list[list[str]]:
+        """
+        The values of the sheet, downloaded at most once per revision of the spreadsheet.
+        Only the FETCH_COLUMNS have values, every other cell is '' (see refresh).
+
+        1. a snapshot younger than the TTL is used as is
+        2. otherwise the spreadsheet's modified time is checked (a small Drive request):
+           if the snapshot in memory or on disk is of that revision, it's used
+        3. otherwise the whole sheet is downloaded and the snapshot saved
+
+        Pass the revision the caller just got from get_revision to skip step 1: the values are then
+        always of that revision (the sync relies on it to never checkpoint a newer revision than it read).
+        """
+        if revision is None:
+            if self._snapshot and clock.time() - self._snapshot['fetched_at'] < self._snapshot_ttl:
+                return self._snapshot['values']
+
+            revision = self.get_revision()
+
+        if self._snapshot and revision and self._snapshot['revision'] == revision:
+            self._snapshot['fetched_at'] = clock.time()
+            return self._snapshot['values']
+
+        snapshot = self.__load_snapshot_from_disk()
+        if snapshot and revision and snapshot['revision'] == revision:
+            print(f"Sheet unchanged since last run, using the saved snapshot.")
+            snapshot['fetched_at'] = clock.time()
+            self._snapshot = snapshot
+            return self._snapshot['values']
+
+        return self.refresh(revision=revision)
+
+
+
+
+
+
+    def refresh(self, revision: str | None=None) -> list[list[str]]:
+        """
+        Download the sheet again and save the snapshot in memory and on disk.
+        """
+        if revision is None:
+            revision = self.get_revision()
+
+        values = self.__fetch_columns()
+        print(f"Downloaded sheet \"{self.sheet_name}\". Number of rows: {len(values)}")
+
+        self._snapshot = {'revision': revision, 'fetched_at': clock.time(), 'values': values}
+        self.__save_snapshot_to_disk()
+        return values
+
+
+
+
+
+
+    def __fetch_columns(self) -> list[list[str]]:
+        """
+        The header row and the FETCH_COLUMNS under it, in one batch_get (adjacent columns share a range),
+        laid out like get_all_values: the cells of the other columns are ''.
+        The ranges come from the last snapshot's header, and the header is fetched with them to check
+        that the columns haven't moved. If they have (or there's no snapshot yet) the ranges are made again.
+        """
+        lastSnapshot = self._snapshot or self.__load_snapshot_from_disk()
+        header = lastSnapshot['values'][0] if lastSnapshot and lastSnapshot['values'] else None
+
+        for _ in range(2):
+            if header is None:
+                header = SHEETS_SCHEDULER.call('read', self.sheet.row_values, 1)
+
+            fetchedCols = self.__fetched_cols(header)
+            ranges = ['1:1'] + self.__column_ranges(sorted(fetchedCols.values()))
+            results = SHEETS_SCHEDULER.call('read', self.sheet.batch_get, ranges)
+
+            currentHeader = results[0][0] if results[0] else []
+            if self.__fetched_cols(currentHeader) == fetchedCols:
+                break
+            header = currentHeader # the columns moved since the last snapshot
+        else:
+            print(f"The columns of the sheet keep moving, downloading all of it.")
+            return SHEETS_SCHEDULER.call('read', self.sheet.get_all_values)
+
+        # every range starts on row 2, at the column its name starts with
+        numRows = max((len(result) for result in results[1:]), default=0)
+        values = [list(currentHeader)] + [[''] * len(currentHeader) for _ in range(numRows)]
+        for colRange, result in zip(ranges[1:], results[1:]):
+            firstCol = a1_range_to_grid_range(colRange)['startColumnIndex']
+            for rowIndex, rowValues in enumerate(result):
+                values[rowIndex + 1][firstCol:firstCol + len(rowValues)] = rowValues
+
+        return values
+
+
+    def __fetched_cols(self, header: list[str]) -> Dict[str, int]:
+        """
+        The FETCH_COLUMNS found in the header --> their column numbers, in the order of the sheet.
+        """
+        fetchedCols = {}
+        for idx, col in enumerate(header):
+            if col in FETCH_COLUMNS:
+                fetchedCols[col] = idx + 1
+        return fetchedCols
+
+
+    def __column_ranges(self, colNums: list[int]) -> list[str]:
+        """
+        Sorted column numbers --> one A1 range per run of adjacent columns, from row 2 down, e.g. [5, 6, 9] --> ['E2:F', 'I2:I']
+        """
+        ranges = []
+        for colNum in colNums:
+            if ranges and ranges[-1][1] == colNum - 1:
+                ranges[-1][1] = colNum
+            else:
+                ranges.append([colNum, colNum])
+
+        return [f"{rowcol_to_a1(2, first)}:{rowcol_to_a1(2, last).rstrip('0123456789')}" for first, last in ranges]
+
+
+
+
+
+
+    def get_revision(self) -> str | None:
+        """
+        The spreadsheet's last modified time from Drive, used as the snapshot key.
+        """
+        if not self.spreadsheet:
+            return None
+
+        try:
+            # a Drive request, it doesn't count against the Sheets quota
+            return SHEETS_SCHEDULER.call(None, self.spreadsheet.get_lastUpdateTime)
+        except Exception as e:
+            print(f"Could not get the revision of the sheet: {e}")
+            return None
+
+
+    def __snapshot_path(self) -> Path | None:
+        if not self.spreadsheet or not self.sheet:
+            return None
+        return SNAPSHOT_DIR / f"{self.spreadsheet.id}-{self.sheet.id}.json"
+
+
+    def __load_snapshot_from_disk(self) -> dict | None:
+        path = self.__snapshot_path()
+        if not path or not path.exists():
+            return None
+
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read the saved snapshot {path}: {e}")
+            return None
+
+
+    def __save_snapshot_to_disk(self) -> None:
+        path = self.__snapshot_path()
+        if not path or not self._snapshot['revision']:
+            return None  # a snapshot without a revision can't be checked later
+
+        try:
+            os.makedirs(path.parent, exist_ok=True)
+            tmpPath = path.with_suffix('.tmp')
+            with open(tmpPath, 'w') as f:
+                json.dump(self._snapshot, f)
+            os.replace(tmpPath, path)
+        except OSError as e:
+            print(f"Could not save the snapshot {path}: {e}")
+
+
+    def __patch_snapshot(self, data: list[dict]) -> None:
+        """
+        Apply our own writes to the snapshot in memory, so it stays usable for the rest of the run.
+        The revision is dropped (and the copy on disk removed): once the TTL runs out the sheet is checked again.
+        """
+        path = self.__snapshot_path()
+        if path and path.exists():
+            path.unlink()
+
+        if not self._snapshot:
+            return None
+
+        values = self._snapshot['values']
+        for item in data:
+            gridRange = a1_range_to_grid_range(item['range'])
+            for i, rowValues in enumerate(item['values']):
+                for j, value in enumerate(rowValues):
+                    row = gridRange.get('startRowIndex', 0) + i
+                    col = gridRange.get('startColumnIndex', 0) + j
+                    while len(values) <= row:
+                        values.append([''] * len(values[0]) if values else [])
+                    if len(values[row]) <= col:
+                        values[row] += [''] * (col + 1 - len(values[row]))
+                    values[row][col] = value
+
+        self._snapshot['revision'] = None
+
+
+
+
+
+
+    def get_dataframe_of_sheet(self, revision: str | None=None) -> 'pd.DataFrame':
         """
         Create DataFrame using first row as header
-        This works with the 'cached' sheet, NOT the live sheet online.
+        This works with the 'cached' sheet (see get_sheet_values), NOT always the live sheet online,
+        unless the current revision is passed.
         """
+        import pandas as pd
         
         if not self.sheet:
             print(f"The sheet was not loaded in\n")
             return None
 
-        # turn in to a DataFrame
-        data = self.sheet.get_all_values()
-        df = pd.DataFrame(data[1:], columns=data[0])
-        df = self.__label_years(df=df)
+        # turn in to a DataFrame, of the fetched columns only
+        data = self.get_sheet_values(revision=revision)
+        df = pd.DataFrame({
+            col: [rowValues[colNum - 1] if colNum <= len(rowValues) else '' for rowValues in data[1:]]
+            for col, colNum in self.__fetched_cols(data[0]).items()
+        })
+        df = self.__label_years(df=df, currentYear=self._current_year)
 
         
-        df['DATE'] = df['DATE'].apply(self.__parse_date_flexible)
-        df['IN'] = df['IN'].apply(self.__parse_time_flexible)
-        df['LUNCH IN'] = df['LUNCH IN'].apply(self.__parse_time_flexible)
-        df['LUNCH OUT'] = df['LUNCH OUT'].apply(self.__parse_time_flexible)
-        df['OUT'] = df['OUT'].apply(self.__parse_time_flexible)
-        df['time'] = df['time'].apply(self.__parse_time_flexible)
-        df['hours'] = df['hours'].apply(self.__parse_float_flexible)
+        # dates --> datetime64, times --> timedelta64 (time since midnight), hours --> float64
+        df['DATE'] = self.__parse_date_column(df['DATE'])
+        df['IN'] = self.__parse_time_column(df['IN'])
+        df['LUNCH IN'] = self.__parse_time_column(df['LUNCH IN'])
+        df['LUNCH OUT'] = self.__parse_time_column(df['LUNCH OUT'])
+        df['OUT'] = self.__parse_time_column(df['OUT'])
+        df['time'] = self.__parse_time_column(df['time'])
+        df['hours'] = pd.to_numeric(df['hours'], errors='coerce')
 
         return df
 
@@ -114,27 +401,75 @@ class GoogleSheetManager:
 
 
 
-    def __parse_float_flexible(self, x):
+    def __sniff_format(self, values: 'pd.Series', formats: Dict[str, re.Pattern]) -> str | None:
         """
-        Turns a string float like 4.2 into a float value.
+        Guess the format of a column from a sample of its (non-blank) values.
+        Returns the format that matches the most of the sample, or None.
         """
-        if pd.isna(x) or x == '':
-            return pd.NA
-        
-        if isinstance(x, float):
-            # print(f"x is already correct format")
-            return x
+        sample = values.iloc[:FORMAT_SNIFF_SAMPLE_SIZE]
+        if sample.empty:
+            return None
+
+        matches = {fmt: sample.map(lambda x: bool(regex.match(x))).sum() for fmt, regex in formats.items()}
+        bestFormat = max(matches, key=matches.get)
+        return bestFormat if matches[bestFormat] else None
+
+
+    def __parse_time_column(self, col: 'pd.Series') -> 'pd.Series':
+        """
+        Turns a column of string times like 4:30 PM into timedeltas since midnight (16:30:00).
+        The format is sniffed once, the whole column is parsed in one go, and only
+        the cells that don't fit the format are parsed one by one.
+        """
+        import pandas as pd
+
+        text = col.fillna('').astype(str).str.strip()
+        blank = text == ''
+
+        fmt = self.__sniff_format(text[~blank], TIME_FORMATS)
+        if fmt:
+            parsed = pd.to_datetime(text, format=fmt, errors='coerce')
+            result = parsed - parsed.dt.normalize()
+        else:
+            result = pd.Series(pd.NaT, index=col.index, dtype='timedelta64[ns]')
+
+        outliers = result.isna() & ~blank
+        if outliers.any():
+            fallback = [self.__parse_time_flexible(x) for x in text[outliers]]
+            result[outliers] = pd.Series(
+                [pd.Timedelta(hours=t.hour, minutes=t.minute, seconds=t.second) if isinstance(t, time) else pd.NaT for t in fallback],
+                index=text.index[outliers],
+                dtype='timedelta64[ns]',
+            )
+
+        return result
+
+
+    def __parse_date_column(self, col: 'pd.Series') -> 'pd.Series':
+        """
+        Turns a column of dates (already labelled with years by __label_years) into datetime64.
+        Leftover strings are parsed one by one.
+        """
+        import pandas as pd
+
+        isText = col.map(lambda x: isinstance(x, str))
+        if isText.any():
+            col = col.copy()
+            col[isText] = col[isText].map(self.__parse_date_flexible)
+
+        return pd.to_datetime(col, errors='coerce')
+
+
+
 
-        if isinstance(x, str):
-            return float(x)
-        
-        return pd.NA
 
 
     def __parse_time_flexible(self, x):
         """
         Turns a string time like 4:30 PM into a datetime.time object of time(16, 30, 00)
         """
+        import pandas as pd
+
         if pd.isna(x) or x == '':
             return pd.NaT
         
@@ -155,6 +490,8 @@ class GoogleSheetManager:
         """
         Turns a string date like Sat Jul 26 into a datetime.date object of date(2025, 7, 26)
         """
+        import pandas as pd
+
         if pd.isna(x) or x == '':
             return pd.NaT
         
@@ -175,7 +512,8 @@ class GoogleSheetManager:
     
     
     
-    def __label_years(self, df: pd.DataFrame, currentYear: str='2025', yearDivider: str='YEAR SELECTOR') -> pd.DataFrame:
+    def __label_years(self, df: 'pd.DataFrame', currentYear: str='2025', yearDivider: str='YEAR SELECTOR') -> 'pd.DataFrame':
+        import pandas as pd
 
         ## Label 2023 and 2024 data
         lastRowOf2024 = len(df)
@@ -223,14 +561,14 @@ class GoogleSheetManager:
     
     
     
-    def __map_cols_of_google_sheet(self, df: pd.DataFrame) -> Dict[str, int]:
+    def __map_cols_of_google_sheet(self, header: list[str]) -> Dict[str, int]:
         """
-        Find the positions of the important columns 
+        Find the positions of the important columns (from the header row)
         """
 
         colMap = {}
 
-        for idx, col in enumerate(df.columns):
+        for idx, col in enumerate(header):
             # print(f"The col \"{col}\" has the index: {idx}")
 
             if col in GOOGLE_SHEET_COL_TYPES:
@@ -246,37 +584,40 @@ class GoogleSheetManager:
 
 
 
-    def __find_next_empty_row(self, colMap: Dict[str, int], df: pd.DataFrame) -> int:
+    def __find_next_empty_row(self, colMap: Dict[str, int], values: list[list[str]]) -> int:
         """
         Find the next safe row in the google sheet to update
+        (values are the plain sheet values, header row included)
         """
 
-        nextEmptyGoogleSheetRow = [] # this will always be saved as the row
-                                    # indexing system used by Google Sheets:
-                                    # So the range or rows is [2, len(sheet)]
+        firstFilledGoogleSheetRows = [] # this will always be saved as the row
+                                        # indexing system used by Google Sheets:
+                                        # So the range or rows is [2, len(sheet)]
 
         inColName = WORKSHIFT_TO_SHEET_COLS['clock_in']
         outColName = WORKSHIFT_TO_SHEET_COLS['clock_out']
 
 
         for col in [inColName, outColName]: 
-            rowIndex = 0
-            cell = df[col].iloc[rowIndex]
+            colIndex = colMap[col] - 1
 
-            while pd.isna(cell): 
-                rowIndex += 1
-                cell = df[col].iloc[rowIndex]
-                if not pd.isna(cell): 
-                    nextEmptyGoogleSheetRow.append(rowIndex + 2)
+            # the first row (under the header) whose cell holds a time
+            for rowIndex, rowValues in enumerate(values[1:]):
+                cell = rowValues[colIndex].strip() if colIndex < len(rowValues) else ''
+                if any(regex.match(cell) for regex in TIME_FORMATS.values()):
+                    firstFilledGoogleSheetRows.append(rowIndex + 2)
+                    break
+            else:
+                firstFilledGoogleSheetRows.append(len(values) + 1)
 
             
 
         # if the google sheet is not formatted right, pick the lowest row number --> this overwrites the out-of-place punch
         # else if the the sheet is ordered right pick the row before the first clock in clock out
-        if len(set(nextEmptyGoogleSheetRow)) > 1:
-            nextEmptyGoogleSheetRow = min(nextEmptyGoogleSheetRow)
+        if len(set(firstFilledGoogleSheetRows)) > 1:
+            nextEmptyGoogleSheetRow = min(firstFilledGoogleSheetRows)
         else: 
-            nextEmptyGoogleSheetRow = min(nextEmptyGoogleSheetRow) - 1
+            nextEmptyGoogleSheetRow = min(firstFilledGoogleSheetRows) - 1
                     
         print(f"So let's place a new row at row {nextEmptyGoogleSheetRow}.\n")
         return nextEmptyGoogleSheetRow
@@ -286,6 +627,53 @@ class GoogleSheetManager:
 
 
 
+    def find_shifts_in_sheet(self, shifts: list[WorkShift], values: list[list[str]] | None=None) -> list[bool]:
+        """
+        Which of the shifts already have a row in the sheet: same day (the sheet has no years, so month and day),
+        same clock in and same clock out. Compares values, not text, so '9:00 AM' and '9:00:00 AM' are the same.
+        """
+        if values is None:
+            values = self.get_sheet_values()
+        if not values:
+            return [False] * len(shifts)
+
+        colMap = self.__map_cols_of_google_sheet(values[0])
+        dateIndex = colMap[WORKSHIFT_TO_SHEET_COLS['date']] - 1
+        inIndex = colMap[WORKSHIFT_TO_SHEET_COLS['clock_in']] - 1
+        outIndex = colMap[WORKSHIFT_TO_SHEET_COLS['clock_out']] - 1
+
+        inSheet = set()
+        for rowValues in values[1:]:
+            if len(rowValues) <= max(dateIndex, inIndex, outIndex):
+                continue
+            day = self.__parse_cell(rowValues[dateIndex], ("%Y-%m-%d", "%a %b %d"))
+            clockIn = self.__parse_cell(rowValues[inIndex], ("%H:%M:%S", "%I:%M %p", "%I:%M:%S %p", "%H:%M"))
+            clockOut = self.__parse_cell(rowValues[outIndex], ("%H:%M:%S", "%I:%M %p", "%I:%M:%S %p", "%H:%M"))
+            if day and clockIn and clockOut:
+                inSheet.add((day.month, day.day, clockIn.hour * 60 + clockIn.minute, clockOut.hour * 60 + clockOut.minute))
+
+        return [
+            (shift.date.month, shift.date.day, shift.clock_in.hour * 60 + shift.clock_in.minute, shift.clock_out.hour * 60 + shift.clock_out.minute) in inSheet
+            for shift in shifts
+        ]
+
+
+
+
+
+
+    def __parse_cell(self, cell: str, formats: tuple[str, ...]) -> datetime | None:
+        """
+        A cell in the first of the formats it fits (no pandas, this runs on the punch path).
+        """
+        for fmt in formats:
+            try:
+                return datetime.strptime(cell.strip(), fmt)
+            except ValueError:
+                continue
+        return None
+
+
     def __format_shift_value(self, value: str | date | time) -> str:
         
         if isinstance(value, time):
@@ -304,31 +692,30 @@ class GoogleSheetManager:
 
 
     def __update_sheet_cell(self, sheet, row, col_index, value, colMap, col):
-        numberLetterMap = {
-            # Not necessary, for display only.
-            5: 'E',
-            6: 'F',
-            7: 'G',
-            8: 'H',
-            9: 'I',
-            19: 'S',
-        }
+        # Not necessary, for display only.
+        print(f"Updating: \t{rowcol_to_a1(row, colMap[col])}. \t{value}")
+        response = SHEETS_SCHEDULER.call('write', sheet.update_cell, row, col_index, value)
+        self.__patch_snapshot([{'range': rowcol_to_a1(row, col_index), 'values': [[value]]}])
+        return response
 
-        col_letter = numberLetterMap[colMap[col]]
-        print(f"Updating: \t{col_letter}{row}. \t{value}")
-        return sheet.update_cell(row, col_index, value)
 
 
 
 
 
+    def add_new_shift_to_sheet(self, newShift: WorkShift, debug: bool=False) -> None: 
+        """
+        Writes one shift to the next empty row of the sheet.
+        debug=True uses the old cell-by-cell path (one request per column).
+        """
+        if not debug:
+            return self.add_new_shifts_to_sheet([newShift])
 
-    def add_new_shift_to_sheet(self, newShift: WorkShift) -> None: 
-        df = self.get_dataframe_of_sheet()
+        values = self.get_sheet_values()
         
         # find the corresponding column numbers        
-        colMap = self.__map_cols_of_google_sheet(df)
-        nextEmptyGoogleSheetRow = self.__find_next_empty_row(colMap, df)
+        colMap = self.__map_cols_of_google_sheet(values[0])
+        nextEmptyGoogleSheetRow = self.__find_next_empty_row(colMap, values)
         
         # UPDATE THE GOOGLE SHEET
         feedback = []
@@ -356,3 +743,183 @@ class GoogleSheetManager:
         print(f"The reponses from Google Sheets:")
         for item in feedback: 
             print(f"{item}")
+
+
+
+
+
+
+    def add_new_shifts_to_sheet(self, newShifts: list[WorkShift]) -> None: 
+        """
+        Writes any number of shifts to the sheet in a single batch_update request.
+        The sheet is newest-first, so the oldest new shift goes in the next empty row
+        and every newer shift goes one row above it.
+        """
+        if not newShifts:
+            print(f"No shifts to save to the sheet.")
+            return None
+
+        if not self.sheet:
+            print(f"The sheet was not loaded in\n")
+            return None
+
+        # the plain values are enough to find the row, no DataFrame needed
+        values = self.get_sheet_values()
+
+        # find the corresponding column numbers        
+        colMap = self.__map_cols_of_google_sheet(values[0])
+        nextEmptyGoogleSheetRow = self.__find_next_empty_row(colMap, values)
+
+        # newest shift on top
+        newShifts = sorted(newShifts, key=lambda shift: (shift.date, shift.minutes), reverse=True)
+        firstRow = nextEmptyGoogleSheetRow - len(newShifts) + 1
+        if firstRow < 2:
+            print(f"Not enough empty rows above row {nextEmptyGoogleSheetRow} for {len(newShifts)} shifts.")
+            return None
+
+        # one range per column, covering every new row
+        data = []
+        for col in colMap:
+            shiftAttribute = SHEET_TO_WORKSHIFT_COLS[col]
+            if not shiftAttribute:
+                continue  # skip if mapping is None
+
+            colRange = f"{rowcol_to_a1(firstRow, colMap[col])}:{rowcol_to_a1(nextEmptyGoogleSheetRow, colMap[col])}"
+            values = [[self.__format_shift_value(getattr(shift, shiftAttribute))] for shift in newShifts]
+            data.append({'range': colRange, 'values': values})
+            print(f"Updating: \t{colRange}. \t{[value[0] for value in values]}")
+
+        # goes out together with any other write to this sheet that is waiting for the quota
+        response = SHEETS_SCHEDULER.write(self.sheet, data, value_input_option=ValueInputOption.user_entered)
+        self.__patch_snapshot(data)
+
+        print(f"\nSuccessfully saved {len(newShifts)} shift(s) to sheet in one request!\n")
+        print(f"The reponse from Google Sheets:")
+        print(f"{response}")
+        return response
+
+
+
+
+
+
+
+
+
+
+_clientLock = threading.Lock()
+_client = None
+_sheetKeysLock = threading.Lock()
+
+
+def authorize_client(cached: bool=True) -> gspread.Client:
+    """
+    The authorized gspread client, from the service account file named in .env (GOOGLE_SHEETS_CREDS_FILE).
+    It is made once per process (cached=False makes a new one), and its access token is saved in
+    TOKEN_CACHE_PATH until it expires, so the next process doesn't fetch one again.
+    """
+    global _client
+
+    with _clientLock:
+        if cached and _client is not None:
+            return _client
+
+        env_path = SCRIPTS_DIR / ".env"
+        load_dotenv(dotenv_path=env_path)  # automatically looks for .env in the scripts directory
+
+        creds_path = SCRIPTS_DIR / os.getenv("GOOGLE_SHEETS_CREDS_FILE")
+
+        # Define the scopes
+        scopes = [
+            "https://www.googleapis.com/auth/spreadsheets",
+            "https://www.googleapis.com/auth/drive"
+        ]
+
+        creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
+        if not _load_cached_token(creds):
+            _fetch_token(creds)
+
+        _client = gspread.authorize(creds)
+        return _client
+
+
+def _token_cache_id(creds: Credentials) -> str:
+    return f"{creds.service_account_email} {' '.join(sorted(creds.scopes))}"
+
+
+def _load_cached_token(creds: Credentials) -> bool:
+    """
+    Puts the saved token on creds if it is for this account and these scopes, and doesn't expire soon.
+    A token that gets rejected anyway is refreshed by the client on the 401.
+    """
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            cached = json.load(f)
+        expiry = datetime.fromisoformat(cached['expiry'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    # google-auth keeps the expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if cached.get('for') != _token_cache_id(creds) or expiry - now < timedelta(seconds=TOKEN_MIN_LIFETIME_SECONDS):
+        return False
+
+    creds.token = cached['token']
+    creds.expiry = expiry
+    return True
+
+
+def _fetch_token(creds: Credentials) -> None:
+    """
+    Gets a new access token and saves it, readable by the owner only.
+    """
+    from google.auth.transport.requests import Request
+
+    SHEETS_SCHEDULER.call(None, creds.refresh, Request())
+    try:
+        os.makedirs(TOKEN_CACHE_PATH.parent, exist_ok=True)
+        tmpPath = TOKEN_CACHE_PATH.with_suffix(f'.{os.getpid()}.tmp')
+        with open(os.open(tmpPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump({'for': _token_cache_id(creds), 'token': creds.token, 'expiry': creds.expiry.isoformat()}, f)
+        os.replace(tmpPath, TOKEN_CACHE_PATH)
+    except OSError as e:
+        print(f"Could not save the access token: {e}")
+
+
+
+
+
+
+def load_sheet_keys() -> dict[str, str]:
+    """
+    The saved sheet name : spreadsheet key pairs.
+    """
+    try:
+        with open(SHEET_KEYS_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_sheet_key(sheetName: str, key: str | None) -> None:
+    """
+    Saves the key of sheetName, or forgets it when key is None.
+    """
+    with _sheetKeysLock:
+        keys = load_sheet_keys()
+        if keys.get(sheetName) == key:
+            return None
+
+        if key is None:
+            keys.pop(sheetName, None)
+        else:
+            keys[sheetName] = key
+
+        try:
+            os.makedirs(SHEET_KEYS_PATH.parent, exist_ok=True)
+            tmpPath = SHEET_KEYS_PATH.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmpPath, 'w') as f:
+                json.dump(keys, f, indent=2)
+            os.replace(tmpPath, SHEET_KEYS_PATH)
+        except OSError as e:
+            print(f"Could not save the key of \"{sheetName}\": {e}")
@@ -0,0 +1,140 @@
+# multi sheet loader class
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+
+# user modules
+from classes.shiftTableClass import ShiftTable
+from classes.shiftManagerClass import ShiftManager
+
+
+MAX_SHEET_WORKERS = 4 # sheets fetched at the same time (the Sheets API allows a handful of concurrent requests per user)
+
+# (spreadsheet name, worksheet title or None for the first one, year its dates are labelled with)
+SHEET_SOURCES = [
+    ("Staples Finances 2025", None, '2025'),
+    ("Staples Finances 2023-24", None, '2024'),
+]
+
+
+
+
+
+
+class MultiSheetLoader:
+    """
+    Loads the shifts of several spreadsheets / worksheets at once and merges them into one ShiftTable.
+
+    The client is authorized once and shared. Every source is then opened, downloaded (through its
+    GoogleSheetManager, so the snapshots still apply) and parsed on a bounded thread pool, so the
+    round trips overlap: loading the whole history costs about as long as the slowest sheet
+    instead of the sum of all of them.
+
+    The tables are stacked in the order of the sources, and the shifts that show up in more than one
+    (e.g. the 2024 rows at the bottom of the 2025 sheet) are dropped as near duplicates: the first
+    source wins. A source that fails to load is reported and skipped.
+
+        loader = MultiSheetLoader([("Staples Finances 2025", None, '2025'), ("Staples Finances 2023-24", None, '2024')])
+        table = loader.load()
+        print(loader.stats)
+    """
+
+    def __init__(self, sources: list[tuple[str, str | None, str]]=SHEET_SOURCES, maxWorkers: int=MAX_SHEET_WORKERS, onOverlap: str='reject'):
+        self._sources = list(sources)
+        self._maxWorkers = maxWorkers
+        self._onOverlap = onOverlap
+        self._shiftMngr = ShiftManager()
+        self.stats = {}
+
+
+    @property
+    def sources(self) -> list[tuple[str, str | None, str]]:
+        return self._sources
+
+
+    def __repr__(self):
+        return f"<MultiSheetLoader {len(self._sources)} sources, {self._maxWorkers} workers>"
+
+
+
+
+
+
+    def load(self, client=None) -> ShiftTable:
+        """
+        All the sources as one deduplicated ShiftTable. Pass a client to skip the authorization.
+        """
+        from classes.googleSheetClass import authorize_client
+        from classes.sheetsSchedulerClass import SHEETS_SCHEDULER
+
+        startTime = clock.perf_counter()
+        if client is None:
+            try:
+                client = authorize_client()
+            except Exception as e:
+                print(f"There was error authorizing the Google client: {e}")
+                return ShiftTable.concat([])
+
+        print(f"\nLoading {len(self._sources)} sheet(s) with {min(self._maxWorkers, len(self._sources))} worker(s) ...")
+        with ThreadPoolExecutor(max_workers=self._maxWorkers, thread_name_prefix='sheet') as pool:
+            results = list(pool.map(lambda source: self.__load_source(client, source), self._sources))
+
+        tables = [table for table, _ in results if table is not None]
+        labels = [label for table, sourceLabels in results if table is not None for label in sourceLabels]
+        merged = ShiftTable.concat(tables)
+
+        # each sheet is already clean on its own, so this only finds the shifts that are in several of them
+        keep = self._shiftMngr.drop_conflicting_shifts(merged, onOverlap=self._onOverlap, labels=labels)
+        merged = merged[keep]
+
+        self.stats['total'] = {'shifts': len(merged), 'dropped': int((~keep).sum()), 'seconds': round(clock.perf_counter() - startTime, 2)}
+        self.stats['sheets'] = SHEETS_SCHEDULER.metrics()
+        print(f"Loaded {len(merged)} shifts from {len(tables)} of {len(self._sources)} sheet(s) in {self.stats['total']['seconds']}s.")
+        print(f"Sheets API: {self.stats['sheets']['requests']} requests, {self.stats['sheets']['retries']} retries, {self.stats['sheets']['queuedSeconds']}s waiting for the quota.")
+        return merged
+
+
+    def __load_source(self, client, source: tuple[str, str | None, str]):
+        """
+        One source --> (its ShiftTable, a label per shift), or (None, []) if it couldn't be loaded.
+        Runs on a worker thread.
+        """
+        from classes.googleSheetClass import GoogleSheetManager
+
+        sheetName, worksheet, year = source
+        name = f"{sheetName}/{worksheet}" if worksheet else sheetName
+        startTime = clock.perf_counter()
+
+        try:
+            gglSheetManager = GoogleSheetManager(sheet_name=sheetName, worksheet=worksheet, client=client, current_year=year)
+            df = gglSheetManager.get_dataframe_of_sheet()
+            if df is None:
+                self.stats[name] = {'error': "not loaded"}
+                return None, []
+
+            table, rowNumbers = self._shiftMngr.collect_shift_table_from_dataframe(df, withRowNumbers=True, onOverlap=self._onOverlap)
+
+        except Exception as e:
+            print(f"Could not load \"{name}\": {e}")
+            self.stats[name] = {'error': str(e)}
+            return None, []
+
+        self.stats[name] = {'rows': len(df), 'shifts': len(table), 'seconds': round(clock.perf_counter() - startTime, 2)}
+        return table, [f"{name} row {rowNumber}" for rowNumber in rowNumbers.tolist()]
+
+
+
+
+
+
+
+
+
+
+def parse_sheet_source(spec: str) -> tuple[str, str | None, str]:
+    """
+    'Spreadsheet name[#worksheet title][@year]' --> (name, worksheet, year), e.g.
+    'Staples Finances 2023-24@2024' or 'Staples Finances 2025#Sheet1'
+    """
+    spec, _, year = spec.partition('@')
+    sheetName, _, worksheet = spec.partition('#')
+    return sheetName.strip(), worksheet.strip() or None, year.strip() or '2025'
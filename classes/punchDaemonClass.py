@@ -0,0 +1,327 @@
+# punch daemon class
+import os
+import json
+import socket
+import socketserver
+import signal
+import threading
+import time as clock
+from pathlib import Path
+
+
+SCRIPTS_DIR = Path(__file__).parent.parent
+SHIFTS_SQL_DB_NAME = 'database.db'
+
+DAEMON_SOCKET_PATH = SCRIPTS_DIR / '.cache' / 'punch-daemon.sock'
+DAEMON_TIMEOUT_SECONDS = 30 # how long a client waits for the answer (the sheet write is a network round trip)
+DAEMON_COMMANDS = ('punch', 'sync', 'ping', 'stop')
+DAEMON_POLL_SECONDS = 1.0   # how often the daemon looks at the punch journal when no punches come in
+DAEMON_READ_TIMEOUT_SECONDS = 5 # a client that connects but doesn't send its request line in time is dropped
+
+# this module is imported by the punch client too, so everything heavy is imported in PunchDaemon.__init__
+
+
+
+
+
+
+class PunchDaemon:
+    """
+    Long running process that keeps everything a punch needs warm:
+    the authorized Google Sheet client and its sheet snapshot, the ShiftManager with its
+    open SQLite connection, the punch journal and all the imports. A punch is then one local socket
+    round trip plus a journal commit, instead of a new Python process that authenticates and downloads everything.
+
+    It listens on a Unix socket (only the owner can connect) and answers one JSON request per connection:
+        {"command": "punch", "punches": "Jul 25, 2025 at 4:30 PM\\n..."}  -->  {"ok": true, "message": "...", "shifts": 1}
+    Commands: punch, sync, ping, stop.
+
+    Every request gets its own thread, and a punch only touches the journal (under a lock), so it's
+    answered in milliseconds whatever else is going on. The network work runs on one worker thread:
+    it flushes the punch journal to the sheet (with the journal's backoff when that fails) and syncs the db,
+    right after a punch and every DAEMON_POLL_SECONDS. The sheet and the db are only used under a lock
+    (the worker's flush and sync, and the sync command), never concurrently.
+
+        PunchDaemon(sheetName).serve_forever()
+        send_to_daemon({'command': 'punch', 'punches': punches})
+    """
+
+    def __init__(
+        self,
+        sheetName: str,
+        socketPath: str | Path=DAEMON_SOCKET_PATH,
+        dbPath: str | Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME,
+        journalPath: str | Path | None=None,
+    ):
+        from classes.googleSheetClass import GoogleSheetManager
+        from classes.shiftManagerClass import ShiftManager
+        from classes.punchJournalClass import PunchJournal
+        from classes.sheetsSchedulerClass import SHEETS_SCHEDULER
+
+        self._sheetName = sheetName
+        self._socketPath = Path(socketPath)
+        self._dbPath = Path(dbPath)
+
+        self._GoogleSheetManager = GoogleSheetManager
+        self._gglSheetManager = None
+        self._sheetsScheduler = SHEETS_SCHEDULER
+        self._shiftMngr = ShiftManager()
+        self._journal = PunchJournal() if journalPath is None else PunchJournal(journalPath)
+        self._flushJournal = PunchJournal(self._journal.journal_path) # the worker's own connection
+        self._journalLock = threading.Lock()
+        self._sheetLock = threading.Lock()
+
+        self._server = None
+        self._worker = None
+        self._wakeWorker = threading.Event()
+        self._running = False
+        self.stats = {'requests': 0, 'punches': 0, 'shifts': 0, 'syncs': 0, 'errors': 0}
+
+
+    @property
+    def socket_path(self) -> Path:
+        return self._socketPath
+
+
+    def __repr__(self):
+        return f"<PunchDaemon {self._socketPath} {self.stats}>"
+
+
+
+
+
+
+    def serve_forever(self) -> None:
+        """
+        Warm everything up, then answer requests until a stop request, SIGTERM or Ctrl-C.
+        """
+        if not self.__claim_socket():
+            return None
+
+        # the first request shouldn't pay for the auth and the download
+        self.__sheet_manager()
+        if self._gglSheetManager and self._gglSheetManager.sheet:
+            self._gglSheetManager.get_sheet_values()
+        self._shiftMngr.store(self._dbPath)
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            timeout = DAEMON_READ_TIMEOUT_SECONDS
+
+            def handle(self):
+                try:
+                    line = self.rfile.readline()
+                except TimeoutError:
+                    return None # it never sent its request
+                response = daemon.handle(line)
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        self._server = Server(str(self._socketPath), Handler)
+        self._server.timeout = DAEMON_POLL_SECONDS
+        os.chmod(self._socketPath, 0o600)
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        print(f"Punch daemon listening on {self._socketPath}")
+        self._running = True
+        self._worker = threading.Thread(target=self.__work, name='punch-flush', daemon=True)
+        self._worker.start()
+        try:
+            while self._running:
+                self._server.handle_request() # returns after a request is handed to its thread, or after DAEMON_POLL_SECONDS without one
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+
+    def stop(self) -> None:
+        """
+        Stops taking requests within DAEMON_POLL_SECONDS.
+        """
+        self._running = False
+        self._wakeWorker.set()
+
+
+    def close(self) -> None:
+        self.stop()
+        if self._server:
+            self._server.server_close()
+            self._server = None
+            self._socketPath.unlink(missing_ok=True)
+
+        # a flush stuck in a network retry isn't waited for: it's journaled, the next run flushes it
+        if self._worker:
+            self._worker.join(timeout=DAEMON_POLL_SECONDS)
+            if not self._worker.is_alive():
+                self._shiftMngr.close()
+            self._worker = None
+        with self._journalLock:
+            self._journal.close()
+        print(f"Punch daemon stopped. {self.stats}")
+
+
+    def __claim_socket(self) -> bool:
+        """
+        Removes a socket file left behind by a daemon that died, but never takes over a live one.
+        """
+        if self._socketPath.exists():
+            try:
+                alive = send_to_daemon({'command': 'ping'}, self._socketPath, timeout=1) is not None
+            except OSError:
+                alive = True # it's there, just busy
+            if alive:
+                print(f"A punch daemon is already listening on {self._socketPath}")
+                return False
+            self._socketPath.unlink()
+
+        self._socketPath.parent.mkdir(parents=True, exist_ok=True)
+        return True
+
+
+
+
+
+
+    def handle(self, line: bytes) -> dict:
+        """
+        One request line --> the response.
+        """
+        self.stats['requests'] += 1
+        startTime = clock.perf_counter()
+
+        try:
+            request = json.loads(line)
+            command = request.get('command')
+        except (ValueError, AttributeError):
+            self.stats['errors'] += 1
+            return {'ok': False, 'message': "Bad request, expected one JSON object per line."}
+
+        if command not in DAEMON_COMMANDS:
+            self.stats['errors'] += 1
+            return {'ok': False, 'message': f"Unknown command '{command}', use one of: {', '.join(DAEMON_COMMANDS)}"}
+
+        try:
+            if command == 'punch':
+                response = self.punch(request.get('punches', ''))
+            elif command == 'sync':
+                with self._sheetLock:
+                    response = {'ok': True, 'message': f"Synced: {self.sync()}"}
+            elif command == 'stop':
+                self.stop()
+                response = {'ok': True, 'message': "Stopping."}
+            else:
+                response = {'ok': True, 'message': "pong", 'stats': self.stats, 'sheets': self._sheetsScheduler.metrics()}
+        except Exception as e:
+            # the daemon outlives a bad request (or a network error)
+            print(f"Error handling '{command}': {e}")
+            self.stats['errors'] += 1
+            response = {'ok': False, 'message': f"Error: {e}"}
+
+        response['ms'] = round((clock.perf_counter() - startTime) * 1000, 1)
+        return response
+
+
+    def punch(self, punches: str) -> dict:
+        """
+        Punches --> punch journal (as sent, then as shifts). The sheet write and the db sync happen once the answer is sent.
+        """
+        if not punches.strip():
+            return {'ok': False, 'message': "No punches entered.", 'shifts': 0}
+
+        with self._journalLock:
+            result = self._journal.append_punches(punches)
+            self.stats['punches'] += result['stats']['punches']
+            self.stats['shifts'] += result['journaled']
+        self._wakeWorker.set()
+
+        message = f"Journaled {result['journaled']} shift(s) ({result['duplicates']} already journaled): {', '.join(str(shift) for shift in result['shifts'])}"
+        if result['problems']:
+            message = f"Not every punch made it into a shift ({result['problems']}), the punches are saved in the journal. {message}"
+        return {'ok': result['problems'] is None, 'message': message, 'shifts': len(result['shifts'])}
+
+
+    def sync(self) -> dict:
+        """
+        Sheet --> db. Called with the sheet lock held.
+        """
+        gglSheetManager = self.__sheet_manager()
+        if not gglSheetManager or not gglSheetManager.sheet:
+            return {}
+
+        self.stats['syncs'] += 1
+        return self._shiftMngr.sync_sheet_to_db(gglSheetManager, dbPath=self._dbPath)
+
+
+    def __work(self) -> None:
+        """
+        The worker thread: flushes the journal after every punch (and every DAEMON_POLL_SECONDS)
+        until the daemon stops.
+        """
+        while self._running:
+            self._wakeWorker.wait(timeout=DAEMON_POLL_SECONDS)
+            self._wakeWorker.clear()
+            if self._running:
+                self.__flush_journal()
+        self._flushJournal.close()
+
+
+    def __flush_journal(self) -> None:
+        """
+        Writes the due journal entries to the sheet, then syncs the db if anything went in.
+        """
+        if self._flushJournal.next_attempt_in() != 0:
+            return None
+
+        try:
+            with self._sheetLock:
+                counts = self._flushJournal.flush_to_sheet(self.__sheet_manager())
+                if counts['flushed'] or counts['alreadyInSheet']:
+                    self.sync()
+        except Exception as e:
+            print(f"Error flushing the punch journal: {e}")
+            self.stats['errors'] += 1
+
+
+    def __sheet_manager(self):
+        """
+        The warm GoogleSheetManager, made again if it couldn't connect the last time.
+        """
+        if self._gglSheetManager is None or self._gglSheetManager.sheet is None:
+            self._gglSheetManager = self._GoogleSheetManager(sheet_name=self._sheetName)
+        return self._gglSheetManager
+
+
+
+
+
+
+
+
+
+
+def send_to_daemon(request: dict, socketPath: str | Path=DAEMON_SOCKET_PATH, timeout: float=DAEMON_TIMEOUT_SECONDS) -> dict | None:
+    """
+    Sends one request to the daemon and returns its response, or None when no daemon is listening.
+    A daemon that doesn't answer in time raises TimeoutError.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(str(socketPath))
+            conn.sendall(json.dumps(request).encode() + b'\n')
+
+            response = b''
+            while not response.endswith(b'\n'):
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                response += chunk
+
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+
+    return json.loads(response) if response else None
@@ -0,0 +1,166 @@
+# punch ingester class
+import re
+from datetime import date
+from typing import Iterable, Iterator
+
+# user modules
+from classes.shiftClass import WorkShift
+
+
+# "Jul 25, 2025 at 4:30 PM" (the Apple Shortcut format), "July 25 2025 16:30", or just "4:30 PM"
+PUNCH_PATTERN = re.compile(
+    r"""^\s*
+    (?:(?P<month>[A-Za-z]{3})[A-Za-z]*\.?\s+(?P<day>\d{1,2}),?\s+(?P<year>\d{4})\s*(?:at\s+)?)?
+    (?P<hour>\d{1,2}):(?P<minute>\d{2})(?::\d{2})?\s*(?P<ampm>[AaPp]\.?[Mm]\.?)?
+    \s*$""",
+    re.VERBOSE,
+)
+
+MONTHS = {month: i for i, month in enumerate(('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), start=1)}
+
+MAX_BREAK_MINUTES = 2 * 60  # a longer gap after an out punch starts a new shift
+
+
+
+
+
+class PunchIngester:
+    """
+    Turns a stream of time clock punches (one per line, in any order) into WorkShifts, in one pass.
+
+    The punches are grouped by day (sorted within it), and a break longer than maxBreak starts a new shift.
+    In a group:
+    - 2 punches:    clock in, clock out
+    - 4 punches:    clock in, lunch in, lunch out, clock out
+    - more (even):  split into 4-punch shifts (and a 2-punch one at the end)
+    - odd:          a punch is missing, the group is skipped and counted
+
+    A punch with only a time belongs to the day of the punch before it (today if it's the first).
+    The punches are kept per day until the input ends (a minute per punch, so even a whole exported
+    time clock history is small), so days may be interleaved: a late punch still joins its day.
+
+        ingester = PunchIngester()
+        with open('punches.txt') as f:
+            for shift in ingester.iter_shifts(f):
+                ...
+        print(ingester.stats)
+    """
+
+    def __init__(self, maxBreak: int=MAX_BREAK_MINUTES, rate_type: str='staples copy center'):
+        self._maxBreak = maxBreak
+        self._rate_type = rate_type
+        self._dates = {} # (year, month, day) --> date, each day is only built once
+        self.stats = {'punches': 0, 'shifts': 0, 'badLines': 0, 'skippedGroups': 0}
+
+
+    def __repr__(self):
+        return f"<PunchIngester {self.stats}>"
+
+
+
+
+
+
+    def parse_punch(self, line: str, lastDate: date | None=None) -> tuple[date, int] | None:
+        """
+        One punch line --> (date, minutes since midnight), or None if the line isn't a punch.
+        """
+        match = PUNCH_PATTERN.match(line)
+        if not match:
+            return None
+
+        month, day, year, hour, minute, ampm = match.group('month', 'day', 'year', 'hour', 'minute', 'ampm')
+
+        hour = int(hour)
+        minute = int(minute)
+        if ampm:
+            if not 1 <= hour <= 12:
+                return None
+            hour = hour % 12 + (12 if ampm[0] in 'Pp' else 0)
+        if hour > 23 or minute > 59:
+            return None
+
+        if month is None:
+            punchDate = lastDate or date.today()
+        else:
+            key = (year, month, day)
+            punchDate = self._dates.get(key)
+            if punchDate is None:
+                monthNumber = MONTHS.get(month[:3].lower())
+                if monthNumber is None:
+                    return None
+                try:
+                    punchDate = date(int(year), monthNumber, int(day))
+                except ValueError:
+                    return None
+                self._dates[key] = punchDate
+
+        return punchDate, hour * 60 + minute
+
+
+    def iter_shifts(self, lines: Iterable[str] | str) -> Iterator[WorkShift]:
+        """
+        Yields the shifts, day by day in date order, once all the lines have been read.
+        lines can be a string (split on new lines), a file or any iterable of lines.
+        """
+        if isinstance(lines, str):
+            lines = lines.splitlines()
+
+        day = None
+        punchesByDay = {} # day --> set of minutes: the same punch sent twice only counts once
+
+        for line in lines:
+            if not line.strip():
+                continue
+
+            punch = self.parse_punch(line, day)
+            if punch is None:
+                self.stats['badLines'] += 1
+                continue
+            self.stats['punches'] += 1
+
+            day, minute = punch
+            punchesByDay.setdefault(day, set()).add(minute)
+
+        for day in sorted(punchesByDay):
+            yield from self.__day_to_shifts(day, punchesByDay[day])
+
+        if self.stats['badLines'] or self.stats['skippedGroups']:
+            print(f"Punches: skipped {self.stats['badLines']} unreadable line(s) and {self.stats['skippedGroups']} shift(s) with a missing punch.")
+
+
+    def __day_to_shifts(self, day: date, dayPunches: set[int]) -> Iterator[WorkShift]:
+        """
+        Sorts one day's punches and splits them into shifts wherever an out punch
+        is followed by a gap longer than maxBreak (an even number of punches so far is an out punch).
+        """
+        group = []
+        for minute in sorted(dayPunches):
+            if group and len(group) % 2 == 0 and minute - group[-1] > self._maxBreak:
+                yield from self.__group_to_shifts(day, group)
+                group = []
+            group.append(minute)
+
+        if group:
+            yield from self.__group_to_shifts(day, group)
+
+
+    def __group_to_shifts(self, day: date, minutes: list[int]) -> Iterator[WorkShift]:
+        if len(minutes) % 2:
+            print(f"Missing punch on {day}: {len(minutes)} punches, skipping them.")
+            self.stats['skippedGroups'] += 1
+            return
+
+        i = 0
+        while i < len(minutes):
+            if len(minutes) - i >= 4:
+                clockIn, lunchIn, lunchOut, clockOut = minutes[i:i + 4]
+                i += 4
+                shift = WorkShift(day, clockIn, clockOut, lunchIn, lunchOut, rate_type=self._rate_type)
+            else:
+                clockIn, clockOut = minutes[i:i + 2]
+                i += 2
+                shift = WorkShift(day, clockIn, clockOut, rate_type=self._rate_type)
+
+            self.stats['shifts'] += 1
+            yield shift
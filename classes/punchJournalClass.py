@@ -0,0 +1,404 @@
+# punch journal class
+import os
+import sys
+import fcntl
+import sqlite3
+import hashlib
+import subprocess
+import time as clock
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+# user modules
+from classes.shiftClass import WorkShift, EPOCH_ORDINAL, shift_to_db_row
+from classes.punchIngesterClass import PunchIngester
+
+
+SCRIPTS_DIR = Path(__file__).parent.parent
+PUNCH_JOURNAL_NAME = 'punch-journal.db'
+FLUSH_LOG_PATH = SCRIPTS_DIR / '.cache' / 'punch-flush.log'
+
+FLUSH_BATCH_SIZE = 50             # shifts per batch_update
+FLUSH_BACKOFF_SECONDS = 5         # the first retry waits this long, every failure after that doubles it
+FLUSH_MAX_BACKOFF_SECONDS = 15 * 60
+FLUSH_GIVE_UP_SECONDS = 60 * 60   # a background flusher stops after this long, what's left waits for the next one
+
+SCHEMA_PUNCH_JOURNAL = """
+    CREATE TABLE IF NOT EXISTS journal (
+        id              INTEGER PRIMARY KEY,
+        idempotency_key TEXT NOT NULL UNIQUE,   -- the same shift punched twice is only journaled once
+        date            INTEGER NOT NULL,       -- epoch day
+        clock_in        INTEGER NOT NULL,       -- minutes since midnight
+        clock_out       INTEGER NOT NULL,
+        lunch_in        INTEGER NOT NULL,
+        lunch_out       INTEGER NOT NULL,
+        rate_type       TEXT NOT NULL,
+        notes           TEXT NOT NULL DEFAULT '',
+        journaled_at    TEXT NOT NULL,
+        flushed_at      TEXT,                   -- NULL until the shift is in the sheet
+        attempts        INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0, -- unix time, pushed back after every failed attempt
+        last_error      TEXT
+    );
+    CREATE INDEX IF NOT EXISTS journal_pending ON journal (next_attempt_at) WHERE flushed_at IS NULL;
+
+    CREATE TABLE IF NOT EXISTS punches (
+        id          INTEGER PRIMARY KEY,
+        text        TEXT NOT NULL,              -- the punches exactly as they were sent, saved before they're parsed
+        received_at TEXT NOT NULL,
+        shifts      INTEGER,                    -- shifts made from them, NULL if parsing never finished
+        problems    TEXT                        -- unreadable lines and missing punches, NULL when there were none
+    );
+"""
+
+SQL_JOURNAL_SHIFT = """
+    INSERT OR IGNORE INTO journal (
+        idempotency_key, date, clock_in, clock_out, lunch_in, lunch_out, rate_type, notes, journaled_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_PENDING = """
+    SELECT id, date, clock_in, clock_out, lunch_in, lunch_out, rate_type, notes, attempts
+    FROM journal
+    WHERE flushed_at IS NULL AND next_attempt_at <= ?
+    ORDER BY id
+"""
+SQL_RECORD_PUNCHES = "INSERT INTO punches (text, received_at) VALUES (?, ?)"
+SQL_MARK_PUNCHES_PARSED = "UPDATE punches SET shifts = ?, problems = ? WHERE id = ?"
+SQL_NEXT_ATTEMPT = "SELECT MIN(next_attempt_at) FROM journal WHERE flushed_at IS NULL"
+SQL_MARK_FLUSHED = "UPDATE journal SET flushed_at = ?, last_error = NULL WHERE id = ?"
+SQL_MARK_FAILED = "UPDATE journal SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?"
+SQL_COUNT_JOURNAL = """
+    SELECT
+        COALESCE(SUM(flushed_at IS NULL), 0),
+        COALESCE(SUM(flushed_at IS NULL AND attempts > 0), 0),
+        COALESCE(SUM(flushed_at IS NOT NULL), 0)
+    FROM journal
+"""
+
+
+
+
+
+
+class PunchJournal:
+    """
+    Write-ahead journal of punched shifts, in its own small SQLite file.
+
+    A punch is committed here first (one local transaction, fsync'd) and acknowledged,
+    and the journal is flushed to the Google Sheet afterwards, in batches. A failed batch
+    stays in the journal and is retried with exponential backoff, so a slow or missing
+    network never blocks a punch and never loses one.
+
+    Every shift has an idempotency key (a hash of its content): the same punches sent twice
+    are only journaled once, and before a retry the sheet is downloaded fresh and the shifts
+    that already made it in (a write that timed out but went through) are not written again.
+
+    The punches themselves are saved (as sent) before they're parsed, so punches that don't make a shift
+    (a missing or unreadable one) are still on disk, in the punches table, to fix by hand.
+
+        journal = PunchJournal()
+        journal.append_punches(punches)            # milliseconds
+        journal.flush_to_sheet(gglSheetManager)    # whenever the network is there
+    """
+
+    def __init__(self, journalPath: str | Path=SCRIPTS_DIR / PUNCH_JOURNAL_NAME):
+        self._journalPath = Path(journalPath)
+        self._conn = None
+        self._lockFile = None
+        self._lockDepth = 0
+
+
+    @property
+    def journal_path(self) -> Path:
+        return self._journalPath
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+    def __repr__(self):
+        return f"<PunchJournal {self._journalPath} {self.counts()}>"
+
+
+    def __connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self._journalPath.parent, exist_ok=True)
+            # may be handed between threads (the daemon's request threads), but only used by one at a time
+            self._conn = sqlite3.connect(self._journalPath, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = FULL")   # a journaled punch survives a power cut
+            self._conn.executescript(SCHEMA_PUNCH_JOURNAL)
+        return self._conn
+
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+
+
+
+
+    def append_punches(self, punches: str) -> dict:
+        """
+        Saves the punches as sent, then parses them and journals their shifts.
+        Returns {'shifts': [..], 'journaled': .., 'duplicates': .., 'problems': str or None, 'stats': the ingester's stats}.
+        problems is set when a punch didn't make it into a shift (the punches stay in the punches table).
+        """
+        receivedAt = datetime.now().isoformat(timespec='seconds')
+        conn = self.__connection()
+        with conn:
+            punchesId = conn.execute(SQL_RECORD_PUNCHES, (punches, receivedAt)).lastrowid
+
+        ingester = PunchIngester()
+        newShifts = list(ingester.iter_shifts(punches))
+
+        problems = []
+        if ingester.stats['badLines']:
+            problems.append(f"{ingester.stats['badLines']} unreadable line(s)")
+        if ingester.stats['skippedGroups']:
+            problems.append(f"{ingester.stats['skippedGroups']} shift(s) with a missing punch")
+        if not newShifts and not problems:
+            problems.append("no shifts in the punches")
+        problems = ', '.join(problems) or None
+
+        counts = self.append(newShifts, punchesId=punchesId, problems=problems)
+        return {'shifts': newShifts, **counts, 'problems': problems, 'stats': ingester.stats}
+
+
+    def append(self, shifts: list[WorkShift], punchesId: int | None=None, problems: str | None=None) -> dict[str, int]:
+        """
+        Journals the shifts in one transaction, marking the punches they came from (if any) as parsed.
+        Returns {'journaled': .., 'duplicates': ..}
+        """
+        journaledAt = datetime.now().isoformat(timespec='seconds')
+        conn = self.__connection()
+
+        journaled = 0
+        with conn:
+            for shift in shifts:
+                row = shift_to_db_row(shift)
+                journaled += conn.execute(SQL_JOURNAL_SHIFT, (idempotency_key(shift), *row, journaledAt)).rowcount
+            if punchesId is not None:
+                conn.execute(SQL_MARK_PUNCHES_PARSED, (len(shifts), problems, punchesId))
+
+        return {'journaled': journaled, 'duplicates': len(shifts) - journaled}
+
+
+    def pending(self, dueOnly: bool=True) -> list[tuple[int, WorkShift, int]]:
+        """
+        (journal id, shift, attempts so far) of the shifts not in the sheet yet, oldest first.
+        dueOnly leaves out the ones still waiting out their backoff.
+        """
+        now = clock.time() if dueOnly else float('inf')
+        return [
+            (journalId, WorkShift(date.fromordinal(day + EPOCH_ORDINAL), clockIn, clockOut, lunchIn, lunchOut, rate_type=rateType, notes=notes), attempts)
+            for journalId, day, clockIn, clockOut, lunchIn, lunchOut, rateType, notes, attempts
+            in self.__connection().execute(SQL_SELECT_PENDING, (now,))
+        ]
+
+
+    def next_attempt_in(self) -> float | None:
+        """
+        Seconds until the next pending shift is due (0 if one is due now), None when nothing is pending.
+        """
+        nextAttempt = self.__connection().execute(SQL_NEXT_ATTEMPT).fetchone()[0]
+        if nextAttempt is None:
+            return None
+        return max(0.0, nextAttempt - clock.time())
+
+
+    def counts(self) -> dict[str, int]:
+        pending, failing, flushed = self.__connection().execute(SQL_COUNT_JOURNAL).fetchone()
+        return {'pending': pending, 'failing': failing, 'flushed': flushed}
+
+
+    def mark_flushed(self, journalIds: list[int]) -> None:
+        flushedAt = datetime.now().isoformat(timespec='seconds')
+        with self.__connection() as conn:
+            conn.executemany(SQL_MARK_FLUSHED, [(flushedAt, journalId) for journalId in journalIds])
+
+
+    def mark_failed(self, entries: list[tuple[int, WorkShift, int]], error: str) -> None:
+        """
+        Pushes the next attempt back: FLUSH_BACKOFF_SECONDS, then twice as long after every failure.
+        """
+        now = clock.time()
+        with self.__connection() as conn:
+            conn.executemany(SQL_MARK_FAILED, [
+                (now + min(FLUSH_MAX_BACKOFF_SECONDS, FLUSH_BACKOFF_SECONDS * 2 ** attempts), error, journalId)
+                for journalId, _, attempts in entries
+            ])
+
+
+
+
+
+
+    @contextmanager
+    def flush_lock(self):
+        """
+        Yields True if this journal may flush: only one process (the daemon, a background flusher
+        or a sync) writes the journal to the sheet at a time. Re-entrant within one PunchJournal.
+        """
+        if self._lockDepth:
+            self._lockDepth += 1
+            try:
+                yield True
+            finally:
+                self._lockDepth -= 1
+            return
+
+        os.makedirs(self._journalPath.parent, exist_ok=True)
+        lockFile = open(self._journalPath.with_suffix('.lock'), 'w')
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lockFile.close()
+            yield False
+            return
+
+        self._lockFile = lockFile
+        self._lockDepth = 1
+        try:
+            yield True
+        finally:
+            self._lockDepth = 0
+            self._lockFile = None
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+            lockFile.close()
+
+
+    def flush_to_sheet(self, gglSheetManager, batchSize: int=FLUSH_BATCH_SIZE) -> dict[str, int]:
+        """
+        One attempt at writing the due shifts to the sheet, batchSize shifts per request.
+        Returns {'flushed': .., 'alreadyInSheet': .., 'failed': .., 'waiting': ..}
+        """
+        counts = {'flushed': 0, 'alreadyInSheet': 0, 'failed': 0, 'waiting': 0}
+
+        with self.flush_lock() as locked:
+            if not locked:
+                print(f"The punch journal is being flushed by another process.")
+                return counts
+
+            due = self.pending()
+            counts['waiting'] = self.counts()['pending'] - len(due)
+            if not due:
+                return counts
+
+            if not gglSheetManager or not gglSheetManager.sheet:
+                self.mark_failed(due, "The Google Sheet could not be loaded.")
+                counts['failed'] = len(due)
+                print(f"Punch journal: the sheet isn't loaded, {len(due)} shift(s) will be retried.")
+                return counts
+
+            try:
+                # after a failure the write may have gone through anyway, so look at the live sheet
+                values = gglSheetManager.refresh() if any(attempts for _, _, attempts in due) else gglSheetManager.get_sheet_values()
+                inSheet = gglSheetManager.find_shifts_in_sheet([shift for _, shift, _ in due], values)
+            except Exception as e:
+                self.mark_failed(due, str(e))
+                counts['failed'] = len(due)
+                print(f"Punch journal: could not read the sheet ({e}), {len(due)} shift(s) will be retried.")
+                return counts
+
+            alreadyInSheet = [journalId for (journalId, _, _), found in zip(due, inSheet) if found]
+            self.mark_flushed(alreadyInSheet)
+            counts['alreadyInSheet'] = len(alreadyInSheet)
+
+            toWrite = [entry for entry, found in zip(due, inSheet) if not found]
+            for i in range(0, len(toWrite), batchSize):
+                batch = toWrite[i:i + batchSize]
+                try:
+                    response = gglSheetManager.add_new_shifts_to_sheet([shift for _, shift, _ in batch])
+                    error = None if response is not None else "The sheet didn't take the shifts."
+                except Exception as e:
+                    error = str(e)
+
+                if error:
+                    # this batch and the ones after it wait for the next attempt
+                    self.mark_failed(toWrite[i:], error)
+                    counts['failed'] = len(toWrite) - i
+                    print(f"Punch journal: {error} ({counts['failed']} shift(s) will be retried)")
+                    break
+
+                self.mark_flushed([journalId for journalId, _, _ in batch])
+                counts['flushed'] += len(batch)
+
+        print(f"Punch journal flushed: {counts}")
+        return counts
+
+
+    def flush_until_empty(self, sheetName: str, giveUpAfter: float=FLUSH_GIVE_UP_SECONDS) -> dict[str, int]:
+        """
+        The background flusher: keeps flushing (waiting out the backoff in between)
+        until nothing is pending, or giveUpAfter seconds have gone by.
+        """
+        from classes.googleSheetClass import GoogleSheetManager
+
+        gglSheetManager = None
+        deadline = clock.time() + giveUpAfter
+
+        with self.flush_lock() as locked:
+            if not locked:
+                print(f"The punch journal is already being flushed by another process.")
+                return self.counts()
+
+            while True:
+                wait = self.next_attempt_in()
+                if wait is None or clock.time() + wait > deadline:
+                    break
+
+                if wait:
+                    # short naps, so a shift journaled in the meantime doesn't wait out someone else's backoff
+                    clock.sleep(min(wait, 1.0))
+                    continue
+
+                if gglSheetManager is None or gglSheetManager.sheet is None:
+                    gglSheetManager = GoogleSheetManager(sheet_name=sheetName)
+                self.flush_to_sheet(gglSheetManager)
+
+        counts = self.counts()
+        if counts['pending']:
+            print(f"Punch journal: {counts['pending']} shift(s) still waiting, they'll go with the next flush.")
+        return counts
+
+
+
+
+
+
+
+
+
+
+def idempotency_key(shift: WorkShift) -> str:
+    """
+    Hash of everything about the shift that ends up in the sheet.
+    """
+    return hashlib.sha1("|".join(str(value) for value in shift_to_db_row(shift)).encode()).hexdigest()
+
+
+def start_background_flush(sheetName: str) -> None:
+    """
+    Starts 'apple-shortcut-to-visuals.py flush' detached from this process (it outlives it),
+    with its output going to .cache/punch-flush.log.
+    """
+    os.makedirs(FLUSH_LOG_PATH.parent, exist_ok=True)
+    with open(FLUSH_LOG_PATH, 'a') as log:
+        subprocess.Popen(
+            [sys.executable, str(SCRIPTS_DIR / 'apple-shortcut-to-visuals.py'), 'flush', '--sheetName', sheetName],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+            cwd=SCRIPTS_DIR,
+        )
@@ -0,0 +1,212 @@
+# rate history class
+from bisect import bisect_right
+from datetime import date
+
+# user modules
+from utilities.rates import PAY_RATE_HISTORY
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# (rate type, first day) is packed into one int64 key, so one sorted array covers every rate type
+KEY_DAY_OFFSET = 1 << 31 # date.min is about -719k epoch days
+KEY_STRIDE = 1 << 32
+
+# numpy is only imported by rates_for: WorkShift prices itself with rate_on, so the punch path never loads it
+
+
+
+
+
+class RateHistory:
+    """
+    Effective dated pay rates. Every rate type has its list of (first day, hourly rate),
+    and each rate applies until the next one of the same rate type starts.
+
+    The rates are kept sorted: one shift is priced with a bisect on plain lists,
+    a whole ShiftTable with a single searchsorted on NumPy copies of them (made on first use).
+
+        history = RateHistory(PAY_RATE_HISTORY)
+        history.rate_on('staples cashier', date(2025, 6, 1))                       # 17.80
+        raised = history.with_rate('staples cashier', date(2025, 7, 1), 19.00)
+        table.before_tax_earnings(raised)                                          # re-prices everything at once
+    """
+
+    def __init__(self, history: dict[str, list[tuple[date | int, float]]]):
+        self._rate_types = tuple(history)
+
+        rows = sorted(
+            (code, to_epoch_day(start), float(rate))
+            for code, rateType in enumerate(self._rate_types)
+            for start, rate in history[rateType]
+        )
+        for previous, row in zip(rows, rows[1:]):
+            if previous[:2] == row[:2]:
+                raise ValueError(f"'{self._rate_types[row[0]]}' has two rates starting on the same day ({row[1]})")
+
+        self._code = [row[0] for row in rows]
+        self._start = [row[1] for row in rows]
+        self._rate = [row[2] for row in rows]
+        self._key_list = [code * KEY_STRIDE + (start + KEY_DAY_OFFSET) for code, start in zip(self._code, self._start)] # bisect is faster on a list than searchsorted on a single value
+        self._arrays = None # (key, code, rate) as NumPy arrays, see __as_arrays
+
+
+    @property
+    def rate_types(self) -> tuple[str, ...]:
+        return self._rate_types
+
+
+    def __len__(self):
+        return len(self._rate)
+
+
+    def __eq__(self, other):
+        if not isinstance(other, RateHistory):
+            return NotImplemented
+        return sorted(self.rows()) == sorted(other.rows())
+
+
+    def __repr__(self):
+        return f"<RateHistory {len(self._rate_types)} rate types, {len(self)} rates>"
+
+
+
+
+
+
+    @classmethod
+    def from_rows(cls, rows) -> 'RateHistory':
+        """
+        From (rate type, first epoch day, rate) rows, e.g. the pay_rates table.
+        """
+        history = {}
+        for rateType, start, rate in rows:
+            history.setdefault(rateType, []).append((start, rate))
+        return cls(history)
+
+
+    def rows(self) -> list[tuple[str, int, float]]:
+        """
+        (rate type, first epoch day, rate), sorted by rate type then day.
+        """
+        return [
+            (self._rate_types[code], start, rate)
+            for code, start, rate in zip(self._code, self._start, self._rate)
+        ]
+
+
+    def with_rate(self, rate_type: str, start: date, rate: float) -> 'RateHistory':
+        """
+        A copy with one more rate (or a new rate type), e.g. a raise.
+        """
+        history = {}
+        for rateType, day, oldRate in self.rows():
+            if rateType == rate_type and day == to_epoch_day(start):
+                continue
+            history.setdefault(rateType, []).append((day, oldRate))
+        history.setdefault(rate_type, []).append((start, rate))
+        return RateHistory(history)
+
+
+    def current(self) -> dict[str, float]:
+        """
+        {rate type: the latest rate}
+        """
+        return {rateType: rate for rateType, _, rate in self.rows()}
+
+
+
+
+
+
+    def rate_on(self, rate_type: str, day: date | int) -> float:
+        """
+        The hourly rate of rate_type on day, 0.0 for unknown rate types or days before the first rate.
+        """
+        if rate_type not in self._rate_types:
+            return 0.0
+
+        code = self._rate_types.index(rate_type)
+        i = bisect_right(self._key_list, code * KEY_STRIDE + to_epoch_day(day) + KEY_DAY_OFFSET) - 1
+        if i < 0 or self._code[i] != code:
+            return 0.0
+        return self._rate[i]
+
+
+    def rates_for(self, rate_types: tuple[str, ...], rate_code: 'np.ndarray', day: 'np.ndarray') -> 'np.ndarray':
+        """
+        Vectorized rate_on: the rate of every shift at once.
+        rate_code indexes rate_types (like in ShiftTable), day is in epoch days.
+        """
+        import numpy as np
+
+        if not len(self._rate):
+            return np.zeros(len(day), dtype=np.float64)
+
+        # the table's rate codes --> this history's codes (-1 when the history doesn't know the rate type)
+        remap = np.array([self._rate_types.index(rateType) if rateType in self._rate_types else -1 for rateType in rate_types], dtype=np.int64)
+        codes = remap[np.asarray(rate_code, dtype=np.int64)]
+
+        keys = codes * KEY_STRIDE + (np.asarray(day, dtype=np.int64) + KEY_DAY_OFFSET)
+        historyKey, historyCode, historyRate = self.__as_arrays()
+        i = np.searchsorted(historyKey, keys, side='right') - 1
+
+        found = (i >= 0) & (codes >= 0)
+        found[found] &= historyCode[i[found]] == codes[found]
+        return np.where(found, historyRate[np.clip(i, 0, None)], 0.0)
+
+
+    def __as_arrays(self) -> tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """
+        (key, code, rate) as NumPy arrays, made the first time a table is priced.
+        """
+        import numpy as np
+
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._key_list, dtype=np.int64),
+                np.array(self._code, dtype=np.int64),
+                np.array(self._rate, dtype=np.float64),
+            )
+        return self._arrays
+
+
+
+
+
+
+
+
+
+
+def to_epoch_day(day: date | int) -> int:
+    """
+    Days since 1970-01-01 (ints are taken as epoch days already).
+    """
+    if isinstance(day, date):
+        return day.toordinal() - EPOCH_ORDINAL
+    return int(day)
+
+
+
+
+# the configured history (utilities/rates.py): what a new database's pay_rates table starts with
+RATE_HISTORY = RateHistory(PAY_RATE_HISTORY)
+
+# the history WorkShift and ShiftTable are priced with by default.
+# The db is where the rates are kept: opening a ShiftStore swaps in its pay_rates
+_activeRateHistory = RATE_HISTORY
+
+
+def active_rate_history() -> RateHistory:
+    """
+    The pay rates shifts are priced with (the db's once a ShiftStore was opened, else utilities/rates.py).
+    """
+    return _activeRateHistory
+
+
+def use_rate_history(history: RateHistory) -> None:
+    """
+    Price the shifts made from now on with history.
+    """
+    global _activeRateHistory
+    _activeRateHistory = history
@@ -0,0 +1,234 @@
+# sheets scheduler class
+import random
+import threading
+import time as clock
+
+import requests
+
+
+# the Sheets API allows 60 read and 60 write requests per minute per user
+SHEETS_READS_PER_MINUTE = 60
+SHEETS_WRITES_PER_MINUTE = 60
+SHEETS_BURST = 5                    # requests that may go out back to back before the rate applies
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRY_BASE_SECONDS = 1.0            # the first backoff is up to this long, every retry doubles it
+RETRY_MAX_SECONDS = 64.0
+MAX_RETRIES = 8
+
+
+
+
+
+
+class SheetsScheduler:
+    """
+    Every request to the Sheets API goes through here (one scheduler per process, SHEETS_SCHEDULER):
+
+    - rate limiting: a token bucket for reads and one for writes. A bucket holds SHEETS_BURST tokens and
+      refills so that no 60 second window goes over the per-minute quota, so a backfill runs
+      as fast as the quota allows instead of running into it
+    - retries: 429s, 5xx and dropped connections are retried with jittered exponential backoff
+      (full jitter, Retry-After is honoured); after a 429 the bucket is emptied so every thread slows down
+    - write coalescing: writes to the same worksheet that queue up while a write waits for its
+      token go out together, as one batch_update
+    - metrics: see metrics()
+
+        values = SHEETS_SCHEDULER.call('read', worksheet.get_all_values)
+        SHEETS_SCHEDULER.write(worksheet, data, value_input_option=ValueInputOption.user_entered)
+    """
+
+    def __init__(self, readsPerMinute: float=SHEETS_READS_PER_MINUTE, writesPerMinute: float=SHEETS_WRITES_PER_MINUTE, burst: int=SHEETS_BURST, maxRetries: int=MAX_RETRIES):
+        self._buckets = {
+            'read': TokenBucket(ratePerSecond=(readsPerMinute - burst) / 60, capacity=burst),
+            'write': TokenBucket(ratePerSecond=(writesPerMinute - burst) / 60, capacity=burst),
+        }
+        self._maxRetries = maxRetries
+        self._lock = threading.Lock()
+        self._pendingWrites = {} # (worksheet id, value input option) : [queued writes]
+        self._metrics = {
+            'requests': 0, 'reads': 0, 'writes': 0,
+            'retries': 0, 'rateLimited': 0, 'serverErrors': 0, 'connectionErrors': 0, 'failed': 0,
+            'queuedSeconds': 0.0, 'backoffSeconds': 0.0,
+            'writesQueued': 0, 'writeBatches': 0,
+        }
+
+
+    def __repr__(self):
+        return f"<SheetsScheduler {self.metrics()}>"
+
+
+    def metrics(self) -> dict:
+        """
+        Request counts, retries by cause, seconds spent waiting for a token (queued) and backing off,
+        and how many writes went out in how many batches.
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['queuedSeconds'] = round(metrics['queuedSeconds'], 2)
+        metrics['backoffSeconds'] = round(metrics['backoffSeconds'], 2)
+        return metrics
+
+
+    def __count(self, name: str, amount: float=1) -> None:
+        with self._lock:
+            self._metrics[name] += amount
+
+
+
+
+
+
+    def call(self, kind: str | None, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs) once a token of kind ('read' or 'write') is free, retried on transient errors.
+        kind=None takes no token (Drive requests, which aren't under the Sheets quota) but is still retried.
+        """
+        return self.__call(kind, fn, args, kwargs)
+
+
+    def __call(self, kind: str | None, fn, args: tuple, kwargs: dict, hasToken: bool=False):
+        """
+        hasToken: the first attempt's token was already taken (see write), the retries take new ones.
+        """
+        for attempt in range(self._maxRetries + 1):
+            if kind is not None:
+                if not (hasToken and attempt == 0):
+                    self.__count('queuedSeconds', self._buckets[kind].acquire())
+                self.__count(f"{kind}s")
+            self.__count('requests')
+
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self.__retry_delay(e, attempt, kind)
+                if delay is None:
+                    self.__count('failed')
+                    raise
+                print(f"Sheets request failed ({e}), retry {attempt + 1} of {self._maxRetries} in {delay:.1f}s.")
+
+            self.__count('retries')
+            self.__count('backoffSeconds', delay)
+            clock.sleep(delay)
+
+
+    def write(self, worksheet, data: list[dict], value_input_option=None):
+        """
+        worksheet.batch_update(data), coalesced with the other writes to the worksheet that are waiting.
+        The first writer to queue sends everything queued by the time its token comes up, the others
+        wait for that request and get its response (or its error).
+        """
+        key = (getattr(worksheet, 'id', id(worksheet)), str(value_input_option))
+        entry = {'data': data, 'done': threading.Event(), 'response': None, 'error': None}
+
+        with self._lock:
+            queued = self._pendingWrites.setdefault(key, [])
+            queued.append(entry)
+            isLeader = len(queued) == 1
+            self._metrics['writesQueued'] += 1
+
+        if not isLeader:
+            entry['done'].wait()
+        else:
+            self.__count('queuedSeconds', self._buckets['write'].acquire())
+            with self._lock:
+                batch = self._pendingWrites.pop(key)
+                self._metrics['writeBatches'] += 1
+
+            # the ranges are applied in order, so a later write to the same cell still wins
+            merged = [item for queuedEntry in batch for item in queuedEntry['data']]
+            try:
+                response = self.__call('write', worksheet.batch_update, (merged,), {'value_input_option': value_input_option}, hasToken=True)
+                error = None
+            except Exception as e:
+                response, error = None, e
+
+            for queuedEntry in batch:
+                queuedEntry['response'], queuedEntry['error'] = response, error
+                queuedEntry['done'].set()
+
+        if entry['error'] is not None:
+            raise entry['error']
+        return entry['response']
+
+
+    def __retry_delay(self, error: Exception, attempt: int, kind: str | None) -> float | None:
+        """
+        Seconds to wait before retrying, or None if the error isn't worth a retry (or the retries ran out).
+        """
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            self.__count('connectionErrors')
+        elif status == 429:
+            self.__count('rateLimited')
+            if kind is not None:
+                self._buckets[kind].drain() # we're over the quota: the other threads back off too
+        elif status in RETRY_STATUS_CODES:
+            self.__count('serverErrors')
+        else:
+            return None
+
+        if attempt >= self._maxRetries:
+            return None
+
+        # full jitter: anywhere up to the exponential backoff, so retrying threads don't line up again
+        delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+        retryAfter = response.headers.get('Retry-After') if response is not None else None
+        if retryAfter and retryAfter.isdigit():
+            delay = max(delay, float(retryAfter))
+        return delay
+
+
+
+
+
+
+
+
+
+
+class TokenBucket:
+    """
+    capacity tokens, refilled at ratePerSecond. acquire() takes one, sleeping until there is one.
+    """
+
+    def __init__(self, ratePerSecond: float, capacity: int):
+        self._rate = ratePerSecond
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = clock.monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self) -> float:
+        """
+        Returns the seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = clock.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self._rate
+
+            clock.sleep(wait)
+            waited += wait
+
+
+    def drain(self) -> None:
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = clock.monotonic()
+
+
+
+
+# shared by every GoogleSheetManager of the process, the quota is per user, not per sheet
+SHEETS_SCHEDULER = SheetsScheduler()
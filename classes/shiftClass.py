@@ -1,28 +1,77 @@
-from utilities.rates import PAY_RATE_TABLE
 from datetime import datetime, time, date
 
+# user modules
+from classes.rateHistoryClass import active_rate_history
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 
 
 class WorkShift:
+    """
+    One shift. Immutable: the times are stored as minutes since midnight and the
+    length and earnings are worked out once, when the shift is made.
+
+    Two shifts are equal (and hash the same) when they share the natural key
+    (date, clock_in, notes), the same key the shifts table is UNIQUE on.
+    """
+
+    __slots__ = (
+        '_date',
+        '_clock_in',
+        '_clock_out',
+        '_lunch_in',
+        '_lunch_out',
+        '_rate_type',
+        '_notes',
+        '_net_minutes',
+        '_hourly_rate',
+        '_earnings',
+    )
+
+
     def __init__(
         self, 
         date: date,
-        clock_in: time, 
-        clock_out: time, 
-        lunch_in: time = time(1), 
-        lunch_out: time = time(1),
+        clock_in: time | int, 
+        clock_out: time | int, 
+        lunch_in: time | int = time(1), 
+        lunch_out: time | int = time(1),
         rate_type: str = 'staples copy center', 
         notes: str = "", 
     ):
         # variables
-        self._date = date
-        self._clock_in = clock_in
-        self._clock_out = clock_out
-        self._lunch_in = lunch_in
-        self._lunch_out = lunch_out
-        self._rate_type = rate_type
-        self._notes = notes
+        clockIn = minutes_since_midnight(clock_in)
+        clockOut = minutes_since_midnight(clock_out)
+        lunchIn = minutes_since_midnight(lunch_in)
+        lunchOut = minutes_since_midnight(lunch_out)
+        netMinutes = (clockOut - clockIn) - (lunchOut - lunchIn)
+        hourlyRate = active_rate_history().rate_on(rate_type, date) # the rate on the day of the shift, not today's
+
+        object.__setattr__(self, '_date', date)
+        object.__setattr__(self, '_clock_in', clockIn)
+        object.__setattr__(self, '_clock_out', clockOut)
+        object.__setattr__(self, '_lunch_in', lunchIn)
+        object.__setattr__(self, '_lunch_out', lunchOut)
+        object.__setattr__(self, '_rate_type', rate_type)
+        object.__setattr__(self, '_notes', notes)
+        object.__setattr__(self, '_net_minutes', netMinutes)
+        object.__setattr__(self, '_hourly_rate', hourlyRate)
+        object.__setattr__(self, '_earnings', round(netMinutes / 60 * hourlyRate, 2))
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"WorkShift is immutable, cannot set '{name}'")
+
+
+    def __delattr__(self, name):
+        raise AttributeError(f"WorkShift is immutable, cannot delete '{name}'")
+
+
+    def __reduce__(self):
+        # slots + no __setattr__ means pickle/copy have to go through __init__
+        return (WorkShift, (self._date, self._clock_in, self._clock_out, self._lunch_in, self._lunch_out, self._rate_type, self._notes))
 
 
 
@@ -32,19 +81,19 @@ class WorkShift:
 
     @property
     def clock_in(self):
-        return self._clock_in
+        return minutes_to_time(self._clock_in)
 
     @property
     def clock_out(self):
-        return self._clock_out
+        return minutes_to_time(self._clock_out)
 
     @property
     def lunch_in(self):
-        return self._lunch_in
+        return minutes_to_time(self._lunch_in)
 
     @property
     def lunch_out(self):
-        return self._lunch_out
+        return minutes_to_time(self._lunch_out)
 
     @property
     def rate_type(self):
@@ -54,6 +103,24 @@ class WorkShift:
     def notes(self):
         return self._notes
 
+    @property
+    def minutes(self) -> tuple[int, int, int, int]:
+        """
+        (clock_in, clock_out, lunch_in, lunch_out) as minutes since midnight
+        """
+        return (self._clock_in, self._clock_out, self._lunch_in, self._lunch_out)
+
+    @property
+    def net_minutes(self) -> int:
+        return self._net_minutes
+
+    @property
+    def key(self) -> tuple:
+        """
+        The natural key of the shift: (date, clock_in, notes)
+        """
+        return (self._date, self._clock_in, self._notes)
+
 
     
     @property
@@ -89,38 +156,77 @@ class WorkShift:
 
     @property
     def hourly_rate(self) -> float:
-        return PAY_RATE_TABLE.get(self.rate_type, 0.0)
+        return self._hourly_rate
 
 
     def hours_worked(self) -> float:
-        shiftLength = datetime.combine(self.date, self.clock_out) - datetime.combine(self.date, self.clock_in)
-        lunch = datetime.combine(self.date, self.lunch_out) - datetime.combine(self.date, self.lunch_in)
-        # net = (self.clock_out - self.clock_in) - (self.lunch_out - self.lunch_in)
-        net = shiftLength - lunch
-        return net.total_seconds() / 3600
+        return self._net_minutes / 60
 
 
     def before_tax_earnings(self) -> float:
-        return round(self.hours_worked() * self.hourly_rate, 2)
+        return self._earnings
 
 
     @staticmethod
     def from_row(row):
         """
         Helps with loading shifts from a SQL database
+        row: (epoch day, clock in, clock out, lunch in, lunch out, rate type, notes), times in minutes since midnight
         """
-        print(f"from_row got: {row}")
         return WorkShift(
-            date=date.fromisoformat(row[0]),
-            clock_in=time.fromisoformat(row[1]),
-            clock_out=time.fromisoformat(row[2]),
-            lunch_in=time.fromisoformat(row[3]) if row[3] else time(1),
-            lunch_out=time.fromisoformat(row[4]) if row[4] else time(1),
+            date=date.fromordinal(row[0] + EPOCH_ORDINAL),
+            clock_in=row[1],
+            clock_out=row[2],
+            lunch_in=row[3],
+            lunch_out=row[4],
             rate_type=row[5],
             notes=row[6]
         )
 
 
+    def __eq__(self, other):
+        if not isinstance(other, WorkShift):
+            return NotImplemented
+        return self.key == other.key
+
+
+    def __hash__(self):
+        return hash(self.key)
+
+
     def __repr__(self):
         return (f"<WorkShift {self.clock_in.strftime('%-I:%M %p')} - {self.clock_out.strftime('%-I:%M %p')}, "
-                f"{self.hours_worked():.2f} hrs, ${self.before_tax_earnings():.2f}, Note: {self.notes}>")
\ No newline at end of file
+                f"{self.hours_worked():.2f} hrs, ${self.before_tax_earnings():.2f}, Note: {self.notes}>")
+
+
+
+
+
+
+def minutes_since_midnight(theTime: time | int) -> int:
+    """
+    Takes a time like 4:30 PM and returns 990
+    """
+    if isinstance(theTime, time):
+        return theTime.hour * 60 + theTime.minute
+    return int(theTime)
+
+
+def minutes_to_time(minutes: int) -> time:
+    """
+    Takes 990 and returns time(16, 30)
+    """
+    return time(*divmod(minutes, 60))
+
+
+def shift_to_db_row(shift: WorkShift) -> tuple:
+    """
+    The row the db stores (and WorkShift.from_row reads):
+    (epoch day, clock in, clock out, lunch in, lunch out, rate type name, notes)
+    """
+    return (
+        shift.date.toordinal() - EPOCH_ORDINAL,
+        *shift.minutes,
+        shift.rate_type.strip(),
+        shift.notes.strip() if shift.notes else '',
+    )
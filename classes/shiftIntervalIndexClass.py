@@ -0,0 +1,171 @@
+# shift interval index class
+import numpy as np
+
+# user modules
+from classes.shiftTableClass import ShiftTable, MINUTES_PER_DAY
+
+NEAR_DUPLICATE_MINUTES = 15 # two overlapping shifts whose clock in and clock out are this close are the same shift
+
+
+
+
+
+class ShiftIntervalIndex:
+    """
+    Interval index over the shifts of a ShiftTable: the shifts as [start, end) in absolute minutes
+    (epoch day * 1440 + minutes since midnight), sorted by start.
+
+    Finding every overlapping pair is one sort plus one searchsorted, O(n log n + number of pairs),
+    instead of comparing every shift with every other one.
+
+    A conflict is a pair of overlapping shifts. It is a near duplicate when both the clock ins and
+    the clock outs are within the tolerance (the same shift with edited notes or a corrected punch),
+    otherwise it's an overlap (two shifts that can't both be right). Back to back shifts don't overlap.
+
+        index = ShiftIntervalIndex(table)
+        first, second, isDuplicate = index.conflicts()
+        table = table[index.keep_mask()]
+    """
+
+    def __init__(self, table: ShiftTable):
+        self._table = table
+
+        day = table.day.astype(np.int64) * MINUTES_PER_DAY
+        start = day + table.clock_in
+        end = day + table.clock_out
+
+        self._order = np.argsort(start, kind='stable')
+        self._start = start[self._order]
+        self._end = end[self._order]
+
+        # the ends aren't sorted, so a query also needs to know how far back a shift can start
+        self._longest = int((end - start).max()) if len(table) else 0
+
+
+    @property
+    def table(self) -> ShiftTable:
+        return self._table
+
+
+    def __len__(self):
+        return len(self._start)
+
+
+    def __repr__(self):
+        return f"<ShiftIntervalIndex {len(self)} shifts>"
+
+
+
+
+
+
+    def overlaps(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (first, second): table row numbers of every pair of overlapping shifts, first < second.
+        """
+        # sorted by start, so the shifts overlapping shift k from the right are the ones after it
+        # that start before it ends: k + 1 up to the searchsorted of its end
+        stop = np.searchsorted(self._start, self._end, side='left')
+        counts = np.clip(stop - np.arange(len(self)) - 1, 0, None)
+
+        left, right = self.__expand(np.arange(len(self)), np.arange(len(self)) + 1, counts)
+        a = self._order[left]
+        b = self._order[right]
+        return np.minimum(a, b), np.maximum(a, b)
+
+
+    def conflicts(self, tolerance: int=NEAR_DUPLICATE_MINUTES) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (first, second, isDuplicate) for every overlapping pair, sorted by first then second.
+        """
+        first, second = self.overlaps()
+        order = np.lexsort((second, first))
+        first = first[order]
+        second = second[order]
+        return first, second, self.__near(self._table, first, self._table, second, tolerance)
+
+
+    def conflicts_with(self, other: ShiftTable, tolerance: int=NEAR_DUPLICATE_MINUTES) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (mine, theirs, isDuplicate): every shift of other that overlaps a shift of this index
+        (mine are row numbers of this table, theirs of other).
+        """
+        day = other.day.astype(np.int64) * MINUTES_PER_DAY
+        start = day + other.clock_in
+        end = day + other.clock_out
+
+        # candidates start after (start - longest shift) and before end, then the ends are checked
+        lo = np.searchsorted(self._start, start - self._longest, side='right')
+        hi = np.searchsorted(self._start, end, side='left')
+        theirs, mine = self.__expand(np.arange(len(other)), lo, np.clip(hi - lo, 0, None))
+
+        overlapping = self._end[mine] > start[theirs]
+        theirs = theirs[overlapping]
+        mine = self._order[mine[overlapping]]
+        return mine, theirs, self.__near(self._table, mine, other, theirs, tolerance)
+
+
+    def keep_mask(self, tolerance: int=NEAR_DUPLICATE_MINUTES, onOverlap: str='reject') -> np.ndarray:
+        """
+        Which shifts to keep: a shift is dropped when it's a near duplicate of a shift that was kept,
+        and with onOverlap='reject' when it overlaps one at all ('keep' leaves those in).
+        The shifts are taken in start order (table order for the same start), so of A, B and C
+        where only A-B and B-C overlap, B is dropped and C is kept.
+        """
+        if onOverlap not in ('reject', 'keep'):
+            raise ValueError(f"Unknown onOverlap '{onOverlap}', use 'reject' or 'keep'")
+
+        # the shifts in no conflict are kept as they are, only the ones in a conflict are walked
+        first, second = self.overlaps()
+        rank = np.empty(len(self), dtype=np.int64)
+        rank[self._order] = np.arange(len(self))
+        involved = np.unique(rank[np.concatenate((first, second))])
+
+        start = self._start.tolist()
+        end = self._end.tolist()
+        kept = [] # positions in start order
+        dropped = []
+        for position in involved.tolist():
+            if self.__conflicts_with_kept(kept, position, start, end, tolerance, onOverlap):
+                dropped.append(position)
+            else:
+                kept.append(position)
+
+        keep = np.ones(len(self), dtype=bool)
+        keep[self._order[np.array(dropped, dtype=np.int64)]] = False
+        return keep
+
+
+
+
+
+
+    def __expand(self, owners: np.ndarray, firsts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        For every owner, the positions firsts[i], firsts[i] + 1, ... (counts[i] of them), flattened.
+        """
+        total = int(counts.sum())
+        owner = np.repeat(owners, counts)
+        offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owner, np.repeat(firsts, counts) + offset
+
+
+    def __conflicts_with_kept(self, kept: list[int], position: int, start: list[int], end: list[int], tolerance: int, onOverlap: str) -> bool:
+        if onOverlap == 'reject':
+            # the kept shifts don't overlap each other, so only the last one can reach this one
+            return bool(kept) and end[kept[-1]] > start[position]
+
+        # a near duplicate starts at most tolerance minutes earlier
+        for other in reversed(kept):
+            if start[other] < start[position] - tolerance:
+                return False
+            if end[other] > start[position] and abs(end[other] - end[position]) <= tolerance:
+                return True
+        return False
+
+
+    def __near(self, a: ShiftTable, i: np.ndarray, b: ShiftTable, j: np.ndarray, tolerance: int) -> np.ndarray:
+        return (
+            (np.abs(a.clock_in[i].astype(np.int32) - b.clock_in[j]) <= tolerance)
+            & (np.abs(a.clock_out[i].astype(np.int32) - b.clock_out[j]) <= tolerance)
+        )
@@ -1,86 +1,105 @@
 # shift manager class 
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.patches import Patch
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
+import numpy as np
 import os
 import sqlite3
+import hashlib
+import shutil
+from importlib.metadata import version
 
 from pathlib import Path
 
 # user made files 
 from utilities.workshift_data import SHEET_TO_WORKSHIFT_COLS
-from classes.workShiftClass import WorkShift
+from classes.shiftClass import WorkShift, EPOCH_ORDINAL
+from classes.shiftTableClass import ShiftTable
+from classes.shiftStoreClass import ShiftStore
+from classes.punchIngesterClass import PunchIngester, MAX_BREAK_MINUTES
+from classes.shiftIntervalIndexClass import ShiftIntervalIndex, NEAR_DUPLICATE_MINUTES
+from classes.shiftStoreClass import shift_to_db_row, shift_to_db_key
 from utilities.ut_functions import *
 
 
 SCRIPTS_DIR = Path(__file__).parent.parent
 SHIFTS_SQL_DB_NAME = 'database.db'
 
+CHART_CACHE_DIR = SCRIPTS_DIR / '.cache' / 'charts'
+CHART_CACHE_SIZE = 20       # renders kept in the cache, the oldest ones get deleted
+CHART_STYLE_VERSION = 2     # bump this when the drawing code changes, so old renders aren't reused
+CHART_FORMATS = ('png', 'svg')
+
+# level of detail: past these many days one bar per day gets unreadable, so the shifts are binned
+LOD_WEEKLY_AFTER_DAYS = 180
+LOD_MONTHLY_AFTER_DAYS = 2 * 365
+
+MAX_CONFLICTS_PRINTED = 20  # overlapping / duplicate shifts listed one by one, the rest are only counted
+
 
 
 
 
 class ShiftManager:
     def __init__(self):
-        pass
+        self._stores = {} # dbPath : ShiftStore, kept open for the life of the manager
 
 
 
 
 
 
+    def store(self, dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME) -> ShiftStore:
+        """
+        The (long-lived) ShiftStore of a database file.
+        """
+        dbPath = Path(dbPath)
+        if dbPath not in self._stores:
+            self._stores[dbPath] = ShiftStore(dbPath)
+        return self._stores[dbPath]
+
+
+    def close(self) -> None:
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
+
+
+
+
 
 
 
 
 
 
-    def parse_punches_into_shift(self, punchTimes) -> WorkShift:
-        """
-        Capture the time punches entered from the command line
-        Returns: empty list or a list of the punch dates and times in the WorkShift format 
 
-        This also keeps track of the number of punches on the same day.
-        """
 
+    def parse_punches_into_shift(self, punchTimes: str) -> WorkShift | None:
+        """
+        Capture the time punches entered from the command line (one per line, 2 or 4 of them)
+        Returns: the WorkShift they make, or None
+        """
         if not punchTimes: 
             # punch times from the command line 
             print(f"Warning: No punch times entered.")
             return None
 
-        
-        allTimePunches = set()
-        try: 
-            
-            # convert the punch to a WorkShift object
-            punchTimes = punchTimes.split('\n')
-            for punchTime in punchTimes:
-                if punchTime:
-                    allTimePunches.add(datetime.strptime(punchTime, "%b %d, %Y at %I:%M %p"))
-
-            allTimePunches = sorted(allTimePunches)
-
-            # Check if there's the correct number of punches
-            if len(allTimePunches) == 2:
-                newShift = WorkShift(
-                    date=allTimePunches[0].date(),
-                    clock_in=allTimePunches[0].time(),
-                    clock_out=allTimePunches[1].time(),
-                )
-                allTimePunches = newShift
-                
-            elif len(allTimePunches) != 4: 
-                print(f"Invalid number of punches for a shift! Punches: {len(allTimePunches)}")
-                return None
-            
-
-        except Exception as e: 
-            print(f"Error getting and seperating the punch times: {e}")
+        shifts = list(self.iter_shifts_from_punches(punchTimes))
+        if len(shifts) != 1:
+            print(f"Invalid punches for one shift! They make {len(shifts)} shifts.")
             return None
 
-        return allTimePunches
+        return shifts[0]
+
+
+    def iter_shifts_from_punches(self, punches, maxBreak: int=MAX_BREAK_MINUTES):
+        """
+        Yields the shifts in any stream of punches: a string with one punch per line,
+        an open file (e.g. an exported time clock history) or a list of lines.
+        See PunchIngester for how the punches are grouped.
+        """
+        yield from PunchIngester(maxBreak=maxBreak).iter_shifts(punches)
+
 
 
 
@@ -91,37 +110,111 @@ class ShiftManager:
 
 
 
+    def collect_shifts_from_dataframe(self, df: pd.DataFrame) -> list[WorkShift]:
+        return self.collect_shift_table_from_dataframe(df).to_shifts()
 
-    def collect_shifts_from_dataframe(self, df: pd.DataFrame):
+
+
+
+
+
+    def collect_shift_table_from_dataframe(self, df: pd.DataFrame, withRowNumbers: bool=False, onOverlap: str='reject') -> ShiftTable:
+        """
+        Turns the sheet's DataFrame into a ShiftTable in one pass over the columns.
+        A row is kept when it has a date, a clock in and a clock out.
+        Blank lunch punches get the time(1) "skipped lunch" default.
+        Of near duplicate rows only the first (highest up in the sheet) is kept, and so is
+        the first of two overlapping rows, unless onOverlap='keep' (see drop_conflicting_shifts).
+
+        withRowNumbers=True also returns the Google Sheet row number of every kept shift.
+        """
 
         df = self.clean_data(df)
-        shifts = []
+
+        dateCol = WORKSHIFT_TO_SHEET_COLS['date']
+        inCol = WORKSHIFT_TO_SHEET_COLS['clock_in']
+        outCol = WORKSHIFT_TO_SHEET_COLS['clock_out']
+        lunchInCol = WORKSHIFT_TO_SHEET_COLS['lunch_in']
+        lunchOutCol = WORKSHIFT_TO_SHEET_COLS['lunch_out']
+        notesCol = WORKSHIFT_TO_SHEET_COLS['notes']
+
+        days = dateColumnToEpochDays(df[dateCol])
+        clockIns = timeColumnToMinutes(df[inCol])
+        clockOuts = timeColumnToMinutes(df[outCol])
+        lunchIns = timeColumnToMinutes(df[lunchInCol])
+        lunchOuts = timeColumnToMinutes(df[lunchOutCol])
+
+        # validity mask, column by column
+        missingDate = df[dateCol].isna().to_numpy() | np.isnan(days)
+        missingIn = df[inCol].isna().to_numpy() | np.isnan(clockIns)
+        missingOut = df[outCol].isna().to_numpy() | np.isnan(clockOuts)
+        valid = ~(missingDate | missingIn | missingOut)
+
+        # This data is essentially allowed to be blank
+        lunchIns = np.where(np.isnan(lunchIns), 60, lunchIns)
+        lunchOuts = np.where(np.isnan(lunchOuts), 60, lunchOuts)
+
+        table = ShiftTable(
+            day=days[valid],
+            clock_in=clockIns[valid],
+            clock_out=clockOuts[valid],
+            lunch_in=lunchIns[valid],
+            lunch_out=lunchOuts[valid],
+            rate_types=('staples copy center',),
+            notes=df[notesCol].fillna('').astype(str).to_numpy()[valid].tolist(),
+        )
 
         print()
-        print(f"Checking the validity of the rows: ")
-        for _, row in df.iterrows():
-            
-            if not self.is_valid_shift_row(row, df.columns):
-                continue
-            
-            # This data is essentially allowed to be blank
-            lunchIn  = row[WORKSHIFT_TO_SHEET_COLS['lunch_in']]  if not pd.isna(row[WORKSHIFT_TO_SHEET_COLS['lunch_in']])  else time(1)
-            lunchOut = row[WORKSHIFT_TO_SHEET_COLS['lunch_out']] if not pd.isna(row[WORKSHIFT_TO_SHEET_COLS['lunch_out']]) else time(1)
-            
-            newShift = WorkShift(
-                date=row[WORKSHIFT_TO_SHEET_COLS['date']],
-                clock_in=row[WORKSHIFT_TO_SHEET_COLS['clock_in']],
-                clock_out=row[WORKSHIFT_TO_SHEET_COLS['clock_out']],
-                lunch_in=lunchIn,
-                lunch_out=lunchOut,
-                rate_type='staples copy center',
-                notes=row[WORKSHIFT_TO_SHEET_COLS['notes']],
-            )
+        print(f"Checking the validity of the rows: kept {valid.sum()} of {len(valid)} ✔︎")
+        if not valid.all():
+            print(f"Rejected {(~valid).sum()} rows ✖︎ "
+                  f"(missing date: {missingDate.sum()}, missing in: {missingIn.sum()}, missing out: {missingOut.sum()})")
 
-            shifts.append(newShift)
+        # the header is row 1, so the first data row (index 0) is row 2
+        rowNumbers = np.arange(len(df))[valid] + 2
+        keep = self.drop_conflicting_shifts(table, onOverlap=onOverlap, labels=[f"row {rowNumber}" for rowNumber in rowNumbers])
+        table = table[keep]
 
-        return shifts
+        if withRowNumbers:
+            return table, rowNumbers[keep]
+        return table
+
+
+
+
+
+
+    def drop_conflicting_shifts(self, table: ShiftTable, onOverlap: str='reject', tolerance: int=NEAR_DUPLICATE_MINUTES, labels: list[str] | None=None) -> np.ndarray:
+        """
+        Finds the overlapping shifts of the table with an interval index (see ShiftIntervalIndex).
+        Returns the mask of the shifts to keep (see ShiftIntervalIndex.keep_mask): no near duplicates,
+        and no overlaps either with onOverlap='reject'.
+        labels name the shifts in the printout (e.g. their sheet rows).
+        """
+        index = ShiftIntervalIndex(table)
+        keep = index.keep_mask(tolerance=tolerance, onOverlap=onOverlap)
+        if keep.all():
+            return keep
+
+        labels = labels or [f"shift {i}" for i in range(len(table))]
+        first, second, isDuplicate = index.conflicts(tolerance)
+        for i, j, duplicate in zip(first[:MAX_CONFLICTS_PRINTED].tolist(), second.tolist(), isDuplicate.tolist()):
+            if keep[i] == keep[j]:
+                # both kept (an overlap with onOverlap='keep'), or both dropped for a shift that was kept
+                if keep[i] and not duplicate:
+                    print(f"Overlap ✖︎ {labels[j]} {table[j]} overlaps {labels[i]} {table[i]}, kept anyway.")
+                continue
+            if keep[j]:
+                i, j = j, i # j is the one dropped
+            if duplicate:
+                print(f"Near duplicate ✖︎ {labels[j]} {table[j]} is the same shift as {labels[i]}, dropped.")
+            else:
+                print(f"Overlap ✖︎ {labels[j]} {table[j]} overlaps {labels[i]} {table[i]}, dropped.")
 
+        if len(first) > MAX_CONFLICTS_PRINTED:
+            print(f"... and {len(first) - MAX_CONFLICTS_PRINTED} more conflicts.")
+        print(f"Dropped {(~keep).sum()} conflicting shifts, kept {keep.sum()}.")
+        return keep
 
 
 
@@ -129,36 +222,152 @@ class ShiftManager:
 
 
 
-    def plot(self, shifts: list[WorkShift], currentYear='2025', minDate=date(2025, 2, 1), maxDate=date(9999, 1, 1)): 
+
+    def plot(
+        self,
+        shifts: list[WorkShift] | ShiftTable | None=None,
+        currentYear='2025',
+        minDate=date(2025, 2, 1),
+        maxDate=date(9999, 1, 1),
+        dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME,
+        outPath: str | Path | None=None,
+        detail: str='auto',
+    ) -> Path | None: 
         """
         PLOTTING
+        Plots the shifts strictly between minDate and maxDate.
+        Without shifts, only that range is read from the db.
+
+        All the bars are built as arrays and drawn as one PolyCollection,
+        so the draw time barely depends on the number of shifts.
+        matplotlib is only imported once something is actually drawn.
+
+        With outPath (.png or .svg) nothing is shown: the chart is rendered headless
+        into that file and its path is returned. See render_chart().
+
+        detail is 'day', 'week', 'month' or 'auto' (picked from the date range, see detail_level()).
+        Weekly and monthly charts draw one earliest in to latest out envelope per bin and the total hours.
         """
-            
+        if shifts is None:
+            table = self.store(dbPath).query_table(minDate=minDate + timedelta(days=1), maxDate=maxDate - timedelta(days=1))
+        elif isinstance(shifts, ShiftTable):
+            table = shifts
+        else:
+            table = ShiftTable.from_shifts(list(shifts))
+
+        table = table.filter(minDate, maxDate)
+
+        if outPath is not None:
+            return self.render_chart(table, outPath, currentYear=currentYear, minDate=minDate, maxDate=maxDate, detail=detail)
+
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots(figsize=(20, 6))
-        numShifts = 0
-        
+        self.__draw_shifts(ax, table, currentYear, detail)
+        plt.show()
 
-        for shift in shifts: 
-            if shift.date <= minDate or shift.date >= maxDate:
-                continue
 
-            numShifts += 1
 
-            # label full shifts light green
-            color = 'skyblue'
-            if shift.hours_worked() >= 8:
-                color='lightgreen'
 
-            ax.bar(
-                x=shift.date,
-                height=shift.hours_worked(),
-                bottom=self.to_24hr_float(shift.clock_in),
-                label='shift',
-                width=0.93,
-                color=color
-            )
 
 
+    def render_chart(self, table: ShiftTable, outPath: str | Path, currentYear='2025', minDate=date(2025, 2, 1), maxDate=date(9999, 1, 1), detail: str='auto') -> Path:
+        """
+        Headless render of the (already filtered) shifts into outPath, as PNG or SVG (from the suffix).
+        Renders are cached in .cache/charts under a hash of the shift data and the plot parameters,
+        so an unchanged dataset just gets the existing file copied over.
+        No display is needed: the Agg canvas is only imported here, pyplot is never touched.
+        """
+        outPath = Path(outPath)
+        fmt = outPath.suffix.lstrip('.').lower()
+        if fmt not in CHART_FORMATS:
+            raise ValueError(f"Can't render a chart as '{outPath.suffix}', use one of: {', '.join(CHART_FORMATS)}")
+
+        chartKey = self.chart_key(table, currentYear=currentYear, minDate=minDate, maxDate=maxDate, fmt=fmt, detail=detail)
+        cachePath = CHART_CACHE_DIR / f"{chartKey}.{fmt}"
+
+        if cachePath.exists():
+            print(f"Chart unchanged, using the cached render: {cachePath.name}")
+            cachePath.touch() # recently used renders are the last to be pruned
+        else:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            fig = Figure(figsize=(20, 6))
+            FigureCanvasAgg(fig)
+            self.__draw_shifts(fig.subplots(), table, currentYear, detail)
+
+            # write to a temp file first, so a half written chart never lands in the cache
+            CHART_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmpPath = cachePath.with_name(f"{chartKey}.{os.getpid()}.tmp")
+            fig.savefig(tmpPath, format=fmt, bbox_inches='tight')
+            os.replace(tmpPath, cachePath)
+            self.__prune_chart_cache()
+
+        if outPath.resolve() != cachePath.resolve():
+            outPath.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(cachePath, outPath)
+
+        print(f"Chart saved to: {outPath}")
+        return outPath
+
+
+    def chart_key(self, table: ShiftTable, currentYear='2025', minDate=None, maxDate=None, fmt='png', detail='auto') -> str:
+        """
+        Hash of everything that ends up in the chart.
+        Notes and rate types aren't drawn, so they aren't part of it.
+        """
+        key = hashlib.sha1()
+        # the installed version, without importing matplotlib (a cache hit never needs it)
+        key.update(repr((CHART_STYLE_VERSION, version('matplotlib'), fmt, str(currentYear), str(minDate), str(maxDate), detail)).encode())
+        for col in (table.day, table.clock_in, table.clock_out, table.lunch_in, table.lunch_out):
+            key.update(np.ascontiguousarray(col).tobytes())
+        return key.hexdigest()
+
+
+    def __prune_chart_cache(self) -> None:
+        charts = sorted(
+            (path for fmt in CHART_FORMATS for path in CHART_CACHE_DIR.glob(f"*.{fmt}")),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True,
+        )
+        for path in charts[CHART_CACHE_SIZE:]:
+            path.unlink(missing_ok=True)
+
+
+
+
+
+
+    def detail_level(self, table: ShiftTable) -> str:
+        """
+        'day', 'week' or 'month', from how many days the shifts span.
+        """
+        if not len(table):
+            return 'day'
+
+        span = int(table.day.max()) - int(table.day.min())
+        if span > LOD_MONTHLY_AFTER_DAYS:
+            return 'month'
+        if span > LOD_WEEKLY_AFTER_DAYS:
+            return 'week'
+        return 'day'
+
+
+
+
+
+
+    def __draw_shifts(self, ax, table: ShiftTable, currentYear='2025', detail: str='auto') -> None:
+        """
+        Draws the shifts and all the formatting onto ax.
+        Shared by the window (plot) and the headless render (render_chart).
+        """
+        if detail == 'auto':
+            detail = self.detail_level(table)
+        if detail not in ('day', 'week', 'month'):
+            raise ValueError(f"Unknown detail '{detail}', use 'auto', 'day', 'week' or 'month'")
+
         # title 
         if currentYear == '2025':
             ax.set_title("2025 Summer Break Shifts at Staples")
@@ -178,6 +387,44 @@ class ShiftManager:
         ax.tick_params(axis='x', rotation=45)
 
 
+        if detail == 'day':
+            self.__draw_day_bars(ax, table, currentYear)
+        else:
+            self.__draw_binned_envelopes(ax, table, detail)
+
+
+    def __draw_day_bars(self, ax, table: ShiftTable, currentYear='2025') -> None:
+        """
+        One bar per shift: from clock in, as tall as the hours worked.
+        """
+        import matplotlib.dates as mdates
+        from matplotlib.patches import Patch
+        from matplotlib.collections import PolyCollection
+
+        numShifts = len(table)
+
+        heights = table.hours_worked()
+        bottoms = table.clock_in / 60
+        centers = mdates.date2num(table.dates)
+        left = centers - 0.93 / 2
+        right = centers + 0.93 / 2
+
+        bars = np.stack([
+            np.column_stack([left, bottoms]),
+            np.column_stack([left, bottoms + heights]),
+            np.column_stack([right, bottoms + heights]),
+            np.column_stack([right, bottoms]),
+        ], axis=1)
+
+        # label full shifts light green
+        colors = np.where(heights >= 8, 'lightgreen', 'skyblue')
+
+        # x is already in matplotlib date numbers (the date formatter and locator are set below),
+        # so no xaxis_date(): that would run the unit conversion on every polygon
+        ax.add_collection(PolyCollection(bars, facecolors=colors, edgecolors='none'))
+        ax.autoscale_view()
+
+
         if currentYear == '2025':
             ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %d'))
         else: 
@@ -196,76 +443,64 @@ class ShiftManager:
         ]
         ax.legend(handles=legend_elements, loc='upper left', title='Shift Length')
 
-        plt.show()
 
+    def __draw_binned_envelopes(self, ax, table: ShiftTable, period: str) -> None:
+        """
+        One bar per week / month, from the earliest clock in to the latest clock out,
+        and the total hours of each bin on a second y axis.
+        """
+        import matplotlib.dates as mdates
+        from matplotlib.patches import Patch
+        from matplotlib.lines import Line2D
+        from matplotlib.collections import PolyCollection
+
+        bins = table.bins(period)
+        numBins = len(bins['start'])
 
+        left = mdates.date2num(bins['start'].astype('datetime64[D]'))
+        right = mdates.date2num(bins['end'].astype('datetime64[D]'))
+        gap = (right - left) * 0.035 # same gap between the bars as the 0.93 wide day bars
+        bottoms = bins['clock_in'] / 60
+        tops = bins['clock_out'] / 60
 
+        envelopes = np.stack([
+            np.column_stack([left + gap, bottoms]),
+            np.column_stack([left + gap, tops]),
+            np.column_stack([right - gap, tops]),
+            np.column_stack([right - gap, bottoms]),
+        ], axis=1)
 
+        ax.add_collection(PolyCollection(envelopes, facecolors='skyblue', edgecolors='none', alpha=0.7))
+        ax.autoscale_view()
 
 
+        # total hours worked in each bin
+        hoursAx = ax.twinx()
+        hoursAx.plot((left + right) / 2, bins['hours'], color='darkorange', marker='o', markersize=3, linewidth=1.2)
+        hoursAx.set_ylabel(f"Hours Worked per {period.capitalize()}")
+        hoursAx.set_ylim(bottom=0)
 
 
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=24))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y' if period == 'month' else '%b %d %Y'))
 
+        print(f"The number of shifts: {len(table)} ({numBins} {period}s)")
 
 
+        # custom legend entries (on the top axes, so the hours line doesn't cover it)
+        legend_elements = [
+            Patch(facecolor='skyblue', alpha=0.7, label='Earliest In to Latest Out'),
+            Line2D([0], [0], color='darkorange', marker='o', markersize=3, label='Hours Worked'),
+        ]
+        hoursAx.legend(handles=legend_elements, loc='upper left', title=f'Per {period.capitalize()}')
 
 
 
 
 
-    def save_shifts_to_db(self, shifts: list[WorkShift], dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME):
-        print(f"\nSaving {len(shifts)} shifts to database: {dbPath}.")
-        # Ensure the directory exists (in case the path is nested)
-        os.makedirs(dbPath.parent, exist_ok=True)
 
-        # Create the table only if it doesn't already exist
-        conn = sqlite3.connect(dbPath)
-        cur = conn.cursor()
-        
-        # Add UNIQUE constraint to avoid duplicates
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS shifts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT,
-                clock_in TEXT,
-                clock_out TEXT,
-                lunch_in TEXT,
-                lunch_out TEXT,
-                rate_type TEXT,
-                notes TEXT,
-                UNIQUE(date, clock_in, notes)
-            )
-        """)
-
-
-        for shift in shifts:
-            print(f"Saving shift {shift.date} ... ", end='')
-            # print(f"Saving shift {shift.date} in format {shift.date.isoformat()}", end='')
-            response = cur.execute(
-                """
-                INSERT OR IGNORE INTO shifts (
-                    date, clock_in, clock_out, lunch_in, lunch_out, rate_type, notes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, 
-                (
-                    shift.date.isoformat(),
-                    shift.clock_in.isoformat(),
-                    shift.clock_out.isoformat(),
-                    shift.lunch_in.isoformat() if shift.lunch_in else None,
-                    shift.lunch_out.isoformat() if shift.lunch_out else None,
-                    shift.rate_type.strip() if shift.rate_type else None,
-                    shift.notes.strip() if shift.notes else None,
-                )
-            )
-            
-            if cur.rowcount == 1:
-                print(f"✔︎")
-            else:
-                print("✖︎ (likely duplicate).")
 
 
-        conn.commit()
-        conn.close()
 
 
 
@@ -275,54 +510,187 @@ class ShiftManager:
 
 
 
+    def save_shifts_to_db(
+        self,
+        shifts: list[WorkShift] | ShiftTable,
+        dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME,
+        onOverlap: str='reject',
+        tolerance: int=NEAR_DUPLICATE_MINUTES,
+    ) -> dict[str, int]:
+        """
+        Bulk insert: all the shifts go in with one executemany inside one transaction.
+
+        Before that the shifts are checked for overlaps with an interval index, among themselves
+        and against the shifts already in the db on those days:
+        - the exact same shift is already in the db --> skipped (a duplicate)
+        - a near duplicate or the same natural key (date, clock in, notes) with other values,
+          e.g. edited notes or a corrected punch --> replaces the one in the db
+        - any other overlap --> rejected (onOverlap='reject') or saved anyway ('keep')
+
+        Returns the counts: {'inserted': .., 'duplicates': .., 'replaced': .., 'rejected': ..}
+        """
+        if isinstance(shifts, ShiftTable):
+            table = shifts
+            shifts = table.to_shifts()
+        else:
+            shifts = list(shifts)
+            table = ShiftTable.from_shifts(shifts)
 
+        print(f"\nSaving {len(table)} shifts to database: {dbPath}.")
 
+        try:
+            store = self.store(dbPath)
 
+            # among the new shifts
+            keep = self.drop_conflicting_shifts(table, onOverlap=onOverlap, tolerance=tolerance)
+            numDropped = int((~keep).sum())
+            table = table[keep]
+            shifts = [shifts[i] for i in np.flatnonzero(keep).tolist()]
 
-    def pull_shifts_from_db(self, dbPath=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME):
+            # against the db, only the days the new shifts are on are read
+            newShifts, replaceKeys, numDuplicates, numRejected = self.__resolve_db_conflicts(store, table, shifts, onOverlap, tolerance)
+
+            counts = store.insert_shifts(newShifts, replaceKeys=replaceKeys)
+
+        except sqlite3.Error as e:
+            print(f"SQLite error while saving: {e}")
+            return {'inserted': 0, 'duplicates': 0, 'replaced': 0, 'rejected': 0}
+
+        counts = {
+            'inserted': counts['inserted'],
+            'duplicates': counts['duplicates'] + numDuplicates,
+            'replaced': counts.get('replaced', 0),
+            'rejected': numRejected + numDropped,
+        }
+        print(f"Saved: {counts}")
+        return counts
+
+
+    def __resolve_db_conflicts(self, store: ShiftStore, table: ShiftTable, shifts: list[WorkShift], onOverlap: str, tolerance: int):
         """
-        Pull from existing SQL Lite DB that stores the converted versions of the 
-        WorkShift instances.
+        shifts[j] is row j of table.
+        Returns (shifts to insert, db keys to replace, number of duplicates, number rejected)
         """
-        print(f"\nPulling shifts from database: {dbPath}")
+        if not len(table):
+            return [], [], 0, 0
+
+        existing = store.query_table(
+            minDate=date.fromordinal(int(table.day.min()) + EPOCH_ORDINAL),
+            maxDate=date.fromordinal(int(table.day.max()) + EPOCH_ORDINAL),
+        )
+        mine, theirs, isDuplicate = ShiftIntervalIndex(existing).conflicts_with(table, tolerance)
+
+        conflicts = {} # new shift : [(old shift, same shift?)]
+        for i, j, duplicate in zip(mine.tolist(), theirs.tolist(), isDuplicate.tolist()):
+            old = existing[i]
+            conflicts.setdefault(j, []).append((old, duplicate or shift_to_db_key(old) == shift_to_db_key(shifts[j])))
+
+        newShifts = []
+        replaceKeys = []
+        numDuplicates = 0
+        numRejected = 0
+        for j, new in enumerate(shifts):
+            olds = conflicts.get(j)
+            if not olds:
+                newShifts.append(new)
+                continue
+
+            if any(not sameShift for _, sameShift in olds) and onOverlap == 'reject':
+                if numRejected < MAX_CONFLICTS_PRINTED:
+                    others = ", ".join(str(old) for old, sameShift in olds if not sameShift)
+                    print(f"Overlap ✖︎ {new} overlaps {others} in the db, rejected.")
+                numRejected += 1
+                continue
+
+            if any(shift_to_db_row(old) == shift_to_db_row(new) for old, _ in olds):
+                numDuplicates += 1
+                continue
+
+            for old, sameShift in olds:
+                if sameShift:
+                    if len(replaceKeys) < MAX_CONFLICTS_PRINTED:
+                        print(f"Replacing {old} with {new}")
+                    replaceKeys.append(shift_to_db_key(old))
+            newShifts.append(new)
+
+        return newShifts, replaceKeys, numDuplicates, numRejected
+
 
-        if not os.path.exists(dbPath):
-            print(f"Database file does not exist: {dbPath}")
-            return []
 
-        try:
-            conn = sqlite3.connect(dbPath)
-            cur = conn.cursor()
 
-            cur.execute("""
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name='shifts'
-            """)
 
-            if not cur.fetchone():
-                print("Table 'shifts' does not exist in the database.")
-                return []
 
-            cur.execute("""
-                SELECT date, clock_in, clock_out, lunch_in, lunch_out, rate_type, notes 
-                FROM shifts
-            """) 
+    def sync_sheet_to_db(self, gglSheetManager, dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME) -> dict[str, int]:
+        """
+        Incremental sync of a Google Sheet into the database.
+
+        - If the sheet's revision matches the last checkpoint, nothing is downloaded at all.
+        - Otherwise every shift row is hashed and compared with the hash stored for that row
+          number; only new or changed rows are upserted and rows that disappeared are deleted.
+
+        Returns the counts: {'inserted': .., 'updated': .., 'deleted': .., 'unchanged': ..}
+        """
+        counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        sheetName = gglSheetManager.sheet_name
+        print(f"\nSyncing sheet \"{sheetName}\" to database: {dbPath}.")
 
-            rows = cur.fetchall()
-            shifts = [WorkShift.from_row(row) for row in rows]
+        store = self.store(dbPath)
 
+        try:
+            revision = gglSheetManager.get_revision()
+
+            if revision and store.get_checkpoint(sheetName) == revision:
+                print(f"Sheet unchanged since the last sync ({revision}).")
+                return counts
+
+            # the values must be of this revision, not a snapshot from before it (still within its TTL),
+            # or the edits in between would be checkpointed without ever being synced
+            df = gglSheetManager.get_dataframe_of_sheet(revision=revision)
+            if df is None:
+                return counts
+            table, rowNumbers = self.collect_shift_table_from_dataframe(df, withRowNumbers=True)
+
+            storedRows = store.get_sheet_rows(sheetName)
+
+            seenRows = set()
+            changedRows = {}
+            notes = table.notes
+            for i, rowNumber in enumerate(rowNumbers.tolist()):
+                contentHash = hashlib.sha1(
+                    f"{table.day[i]}|{table.clock_in[i]}|{table.clock_out[i]}|{table.lunch_in[i]}|"
+                    f"{table.lunch_out[i]}|{table.rate_types[table.rate_code[i]]}|{notes[i]}".encode()
+                ).hexdigest()
+                seenRows.add(rowNumber)
+
+                if rowNumber in storedRows and storedRows[rowNumber][0] == contentHash:
+                    counts['unchanged'] += 1
+                    continue
+                changedRows[rowNumber] = (contentHash, table[i])
+                counts['updated' if rowNumber in storedRows else 'inserted'] += 1
+
+            removedRows = [rowNumber for rowNumber in storedRows if rowNumber not in seenRows]
+            counts['deleted'] = len(removedRows)
+
+            store.apply_sheet_changes(
+                sheetName,
+                gglSheetManager.snapshot_revision, # the revision that was read
+                rowCount=len(df),
+                syncedAt=datetime.now().isoformat(timespec='seconds'),
+                changedRows=changedRows,
+                removedRows=removedRows,
+            )
 
         except sqlite3.Error as e:
-            print(f"SQLite error: {e}")
-            return []
+            print(f"SQLite error while syncing: {e}")
+            return {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+        print(f"Synced: {counts}")
+        return counts
+
+
 
 
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
-        print(f"Found {len(shifts)} shifts in the db.")
-        return shifts
 
 
 
@@ -331,38 +699,60 @@ class ShiftManager:
 
 
 
+    def pull_shifts_from_db(
+        self,
+        dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME,
+        minDate: date | None=None,
+        maxDate: date | None=None,
+        rate_type: str | None=None,
+        limit: int | None=None,
+    ) -> list[WorkShift]:
+        """
+        Pull from existing SQL Lite DB that stores the converted versions of the 
+        WorkShift instances. See iter_shifts_from_db for the filters.
+        """
+        shifts = list(self.iter_shifts_from_db(dbPath, minDate, maxDate, rate_type, limit))
+        print(f"Found {len(shifts)} shifts in the db.")
+        return shifts
+
 
 
 
 
 
-    def is_valid_shift_row(self, row, columns: list[str]) -> bool:
+    def iter_shifts_from_db(
+        self,
+        dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME,
+        minDate: date | None=None,
+        maxDate: date | None=None,
+        rate_type: str | None=None,
+        limit: int | None=None,
+        batchSize: int=1000,
+    ):
         """
-        Checks on the basis of data like dateCol, inCol, and outCol.
-        If that data is present than it is considered a viable shift.
+        Yields the shifts in the db one at a time, oldest first.
+        The filters go into the SQL (minDate <= date <= maxDate, rate type, limit) and the rows
+        are fetched batchSize at a time, so memory stays flat however big the db gets.
         """
-        dateCell = row[WORKSHIFT_TO_SHEET_COLS['date']]
-        inCell = row[WORKSHIFT_TO_SHEET_COLS['clock_in']]
-        outCell = row[WORKSHIFT_TO_SHEET_COLS['clock_out']]
-        
-        print(f"Is it valid? : {row['DATE']}", end='')
-        # print(f"{row}")
+        print(f"\nPulling shifts from database: {dbPath}")
+
+        if not os.path.exists(dbPath):
+            print(f"Database file does not exist: {dbPath}")
+            return
+
+        try:
+            yield from self.store(dbPath).query_shifts(minDate, maxDate, rate_type, limit, batchSize)
+
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+
+
+
+
 
 
-        if pd.isna(dateCell):
-            print(f" INVALID ✖︎")
-            return False
-            
-        if pd.isna(inCell):
-            print(f" INVALID ✖︎")
-            return False
 
-        if pd.isna(outCell):
-            print(f" INVALID ✖︎")
-            return False
 
-        print(f" kept! ✔︎")
-        return True
 
 
 
@@ -395,6 +785,33 @@ class ShiftManager:
 
 
 
+    def print_rollups(self, period: str='pay_period', minDate: date | None=None, maxDate: date | None=None, dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME):
+        """
+        Hours, earnings and shifts per week / month / pay_period, straight from the db rollups.
+        """
+        print(f"\n\n======================================================")
+        print(f"\tTOTALS PER {period.replace('_', ' ').upper()}:\n")
+
+        for total in self.store(dbPath).rollups(period, minDate=minDate, maxDate=maxDate):
+            print(f"{total['label']:<26} {total['shifts']:>3} shifts {total['hours']:>7.2f} hrs   ${total['earnings']:>9.2f}")
+
+        print(f"======================================================")
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
     def to_24hr_float(self, theTime: time | date | str ):
         """
         Takes a time like 4:30 PM and returns a time like 16.5
@@ -447,11 +864,8 @@ class ShiftManager:
         
         df = self.clean_empty_cols(df)
 
-        ## Remove skip lunch column lol
-        try: 
-            df.drop('skip lunch', axis=1, inplace=True)
-        except: 
-            print(f"Column 'skip lunch' not found")
+        ## Remove skip lunch column lol (a sheet fetched by GoogleSheetManager doesn't have it anymore)
+        df.drop('skip lunch', axis=1, inplace=True, errors='ignore')
 
         return df
 
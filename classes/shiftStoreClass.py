@@ -0,0 +1,673 @@
+# shift store class
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+
+# user modules
+from classes.shiftClass import WorkShift, EPOCH_ORDINAL, shift_to_db_row
+from classes.shiftTableClass import ShiftTable
+from classes.rateHistoryClass import RateHistory, RATE_HISTORY, to_epoch_day, use_rate_history
+from utilities.db_schema import (
+    migrate, run_script, rollup_rebuild_sql, ROLLUP_PERIODS, ROLLUP_REFRESH_SQL,
+    SQL_CREATE_ROLLUP_DAYS, SQL_INSERT_ROLLUP_DAY, SQL_MINUTES_WORKED, SQL_RATE_ON,
+)
+
+SCRIPTS_DIR = Path(__file__).parent.parent
+SHIFTS_SQL_DB_NAME = 'database.db'
+POOL_TIMEOUT_SECONDS = 30 # how long connection() waits for a free connection before giving up
+
+
+
+# The statements are plain module constants: sqlite3 keeps a per-connection cache of
+# prepared statements keyed by the SQL text, so each one is only prepared once per
+# pooled connection.
+SQL_INSERT_RATE_TYPE = "INSERT OR IGNORE INTO rate_types (name) VALUES (?)"
+
+SQL_INSERT_SHIFT = """
+    INSERT OR IGNORE INTO shifts (
+        date, clock_in, clock_out, lunch_in, lunch_out, rate_type_id, notes
+    ) VALUES (?, ?, ?, ?, ?, (SELECT id FROM rate_types WHERE name = ?), ?)
+"""
+
+SQL_UPSERT_SHIFT = """
+    INSERT INTO shifts (
+        date, clock_in, clock_out, lunch_in, lunch_out, rate_type_id, notes
+    ) VALUES (?, ?, ?, ?, ?, (SELECT id FROM rate_types WHERE name = ?), ?)
+    ON CONFLICT(date, clock_in, notes) DO UPDATE SET
+        clock_out = excluded.clock_out,
+        lunch_in = excluded.lunch_in,
+        lunch_out = excluded.lunch_out,
+        rate_type_id = excluded.rate_type_id
+"""
+
+SQL_DELETE_SHIFT = "DELETE FROM shifts WHERE date = ? AND clock_in = ? AND notes = ?"
+
+SQL_SELECT_SHIFTS = """
+    SELECT s.date, s.clock_in, s.clock_out, s.lunch_in, s.lunch_out, r.name, s.notes
+    FROM shifts s
+    JOIN rate_types r ON r.id = s.rate_type_id
+"""
+
+SQL_AGGREGATE_SHIFTS = f"""
+    SELECT {{bucket}} AS bucket,
+        SUM({SQL_MINUTES_WORKED.format(row='s')}) AS minutes,
+        SUM({SQL_MINUTES_WORKED.format(row='s')} * {SQL_RATE_ON.format(row='s')} / 60.0) AS earnings,
+        COUNT(*) AS numShifts
+    FROM shifts s
+    JOIN rate_types r ON r.id = s.rate_type_id
+    {{where}}
+    GROUP BY bucket
+    ORDER BY bucket
+"""
+
+AGGREGATE_BUCKETS = {
+    # group by : SQL for the bucket (s.date is an epoch day)
+    None: "NULL",
+    'day': "s.date",
+    'month': "strftime('%Y-%m', s.date * 86400, 'unixepoch')",
+    'year': "strftime('%Y', s.date * 86400, 'unixepoch')",
+    'rate_type': "r.name",
+}
+
+SQL_SELECT_ROLLUPS = """
+    SELECT ro.start, SUM(ro.minutes), SUM(ro.earnings), SUM(ro.shifts)
+    FROM rollups ro
+    JOIN rate_types r ON r.id = ro.rate_type_id
+    WHERE ro.period = ? {where}
+    GROUP BY ro.start
+    ORDER BY ro.start
+"""
+
+SQL_SELECT_PAY_PERIOD = "SELECT anchor, days FROM pay_period WHERE id = 1"
+SQL_UPDATE_PAY_PERIOD = "UPDATE pay_period SET anchor = {anchor}, days = {days} WHERE id = 1"
+
+SQL_SELECT_PAY_RATES = """
+    SELECT r.name, p.start, p.rate
+    FROM pay_rates p
+    JOIN rate_types r ON r.id = p.rate_type_id
+    ORDER BY r.name, p.start
+"""
+SQL_INSERT_PAY_RATE = "INSERT INTO pay_rates (rate_type_id, start, rate) VALUES ((SELECT id FROM rate_types WHERE name = ?), ?, ?)"
+SQL_DELETE_PAY_RATE = "DELETE FROM pay_rates WHERE rate_type_id = (SELECT id FROM rate_types WHERE name = ?) AND start = ?"
+
+SQL_SELECT_CHECKPOINT = "SELECT revision FROM sync_checkpoints WHERE sheet_name = ?"
+SQL_SAVE_CHECKPOINT = "INSERT OR REPLACE INTO sync_checkpoints (sheet_name, revision, row_count, synced_at) VALUES (?, ?, ?, ?)"
+SQL_SELECT_SHEET_ROWS = "SELECT row_number, content_hash, date, clock_in, notes FROM sheet_rows WHERE sheet_name = ?"
+SQL_DELETE_SHEET_ROW = "DELETE FROM sheet_rows WHERE sheet_name = ? AND row_number = ?"
+SQL_SAVE_SHEET_ROW = """
+    INSERT OR REPLACE INTO sheet_rows (
+        sheet_name, row_number, content_hash, date, clock_in, notes
+    ) VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+
+
+
+
+class ShiftStore:
+    """
+    Owns the SQLite database of shifts.
+
+    Connections are opened lazily, kept open and handed out from a small pool, so the
+    schema check/migration and the pragmas happen once per connection instead of once
+    per call. Safe to share between threads. Use it as a context manager (or call close())
+    to close the connections.
+
+        with ShiftStore() as store:
+            store.insert_shifts(shifts)
+            for shift in store.query_shifts(minDate=date(2025, 6, 1)):
+                ...
+    """
+
+    def __init__(self, dbPath: Path=SCRIPTS_DIR / SHIFTS_SQL_DB_NAME, poolSize: int=4, poolTimeout: float=POOL_TIMEOUT_SECONDS):
+        self._dbPath = Path(dbPath)
+        self._poolSize = poolSize
+        self._poolTimeout = poolTimeout
+        self._pool = queue.LifoQueue(maxsize=poolSize)
+        self._numConnections = 0
+        self._lock = threading.Lock()
+        self._migrateLock = threading.Lock()
+        self._migrated = False
+
+
+    @property
+    def dbPath(self):
+        return self._dbPath
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+    def __repr__(self):
+        return f"<ShiftStore {self.dbPath}, {self._numConnections}/{self._poolSize} connections>"
+
+
+
+
+
+
+    # =====================================================================
+    #            CONNECTIONS
+    # =====================================================================
+
+    def __open_connection(self) -> sqlite3.Connection:
+        # Ensure the directory exists (in case the path is nested)
+        os.makedirs(self.dbPath.parent, exist_ok=True)
+
+        conn = sqlite3.connect(self.dbPath, check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA journal_mode = WAL")     # readers don't block the writer
+        conn.execute("PRAGMA synchronous = NORMAL")   # safe with WAL, far fewer fsyncs
+        conn.execute("PRAGMA cache_size = -20000")    # ~20 MB page cache
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA busy_timeout = 5000")    # wait for the other writer instead of failing
+
+        # Create or upgrade the tables (see utilities/db_schema.py), once per store
+        with self._migrateLock:
+            if not self._migrated:
+                migrate(conn)
+                self.__load_pay_rates(conn)
+                self._migrated = True
+        return conn
+
+
+    def __load_pay_rates(self, conn: sqlite3.Connection) -> None:
+        """
+        The pay_rates table is where the rates are kept: it is filled from utilities/rates.py
+        when empty (a new db), and from then on WorkShift and ShiftTable are priced with it too.
+        """
+        history = RateHistory.from_rows(conn.execute(SQL_SELECT_PAY_RATES))
+        if not len(history):
+            history = RATE_HISTORY
+            with conn:
+                self.__insert_rate_types(conn, set(history.rate_types))
+                conn.executemany(SQL_INSERT_PAY_RATE, history.rows())
+            run_script(conn, rollup_rebuild_sql()) # a db from before version 4 has shifts to price
+        elif history != RATE_HISTORY:
+            print("The pay rates in the db differ from utilities/rates.py, pricing with the db's (see ShiftStore.set_pay_rate).")
+        use_rate_history(history)
+
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool (opening one if the pool isn't full yet).
+        When all of them are in use, waits up to poolTimeout for one to come back, then raises TimeoutError.
+        The connection is only returned when the block ends, so don't yield from inside one.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                canOpen = self._numConnections < self._poolSize
+                if canOpen:
+                    self._numConnections += 1
+            if canOpen:
+                try:
+                    conn = self.__open_connection()
+                except Exception:
+                    with self._lock:
+                        self._numConnections -= 1
+                    raise
+            else:
+                try:
+                    conn = self._pool.get(timeout=self._poolTimeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"No free connection to {self.dbPath} after {self._poolTimeout}s: all {self._poolSize} are in use. "
+                        f"Is a connection() block being held open (e.g. by a generator that was never finished)?"
+                    ) from None
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+
+    def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                    self._numConnections -= 1
+                except queue.Empty:
+                    break
+
+
+
+
+
+
+    # =====================================================================
+    #            WRITING
+    # =====================================================================
+
+    def insert_shifts(self, shifts: list[WorkShift], replaceKeys: list[tuple[int, int, str]]=()) -> dict[str, int]:
+        """
+        Insert the shifts in one transaction, skipping the ones already in the db
+        (same date, clock in and notes).
+        replaceKeys are natural keys (epoch day, clock in, notes) deleted first, in the same transaction.
+        Returns the counts: {'inserted': .., 'duplicates': ..} (and 'replaced' with replaceKeys)
+        """
+        shifts = list(shifts)
+        dbRows = [shift_to_db_row(shift) for shift in shifts]
+        with self.connection() as conn, conn:
+            replaced = conn.executemany(SQL_DELETE_SHIFT, replaceKeys).rowcount if replaceKeys else 0
+            self.__insert_rate_types(conn, {shift.rate_type for shift in shifts})
+            inserted = conn.executemany(SQL_INSERT_SHIFT, dbRows).rowcount
+            if inserted or replaced:
+                self.__refresh_rollups(conn, [row[0] for row in dbRows] + [key[0] for key in replaceKeys])
+
+        counts = {'inserted': inserted, 'duplicates': len(shifts) - inserted}
+        if replaceKeys:
+            counts['replaced'] = replaced
+        return counts
+
+
+    def upsert_shifts(self, shifts: list[WorkShift]) -> int:
+        """
+        Insert the shifts or overwrite the ones with the same natural key, in one transaction.
+        Returns the number of shifts written.
+        """
+        shifts = list(shifts)
+        dbRows = [shift_to_db_row(shift) for shift in shifts]
+        with self.connection() as conn, conn:
+            self.__insert_rate_types(conn, {shift.rate_type for shift in shifts})
+            conn.executemany(SQL_UPSERT_SHIFT, dbRows)
+            self.__refresh_rollups(conn, [row[0] for row in dbRows])
+
+        return len(shifts)
+
+
+    def delete_shifts(self, keys: list[tuple[int, int, str]]) -> int:
+        """
+        Delete shifts by natural key: (epoch day, clock in minutes, notes)
+        """
+        keys = list(keys)
+        with self.connection() as conn, conn:
+            deleted = conn.executemany(SQL_DELETE_SHIFT, keys).rowcount
+            if deleted:
+                self.__refresh_rollups(conn, [key[0] for key in keys])
+            return deleted
+
+
+    def __insert_rate_types(self, conn: sqlite3.Connection, rateTypes: set[str]) -> None:
+        conn.executemany(SQL_INSERT_RATE_TYPE, [(rateType.strip(),) for rateType in rateTypes])
+
+
+    def __refresh_rollups(self, conn: sqlite3.Connection, days: list[int]) -> None:
+        """
+        Recompute the rollups of every period the epoch days fall in, inside the caller's transaction.
+        """
+        if not days:
+            return
+        for statement in SQL_CREATE_ROLLUP_DAYS:
+            conn.execute(statement)
+        conn.executemany(SQL_INSERT_ROLLUP_DAY, [(day,) for day in set(days)])
+        for statement in ROLLUP_REFRESH_SQL:
+            conn.execute(statement)
+
+
+
+
+
+
+    # =====================================================================
+    #            READING
+    # =====================================================================
+
+    def query_shifts(
+        self,
+        minDate: date | None=None,
+        maxDate: date | None=None,
+        rate_type: str | None=None,
+        limit: int | None=None,
+        batchSize: int=1000,
+    ):
+        """
+        Yields the shifts with minDate <= date <= maxDate (and the rate type), oldest first.
+        The rows are fetched batchSize at a time, each batch on a connection borrowed just for it
+        (paging on the natural key), so an iteration that is stopped early or left half done
+        never keeps a connection from the pool.
+        """
+        where, params = self.__where(minDate, maxDate, rate_type)
+        afterKey = ("WHERE " if not where else " AND ") + "(s.date, s.clock_in, s.notes) > (?, ?, ?)"
+        orderBy = " ORDER BY s.date, s.clock_in, s.notes LIMIT ?"
+
+        lastKey = None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            numRows = batchSize if remaining is None else min(batchSize, remaining)
+            if lastKey is None:
+                query, batchParams = f"{SQL_SELECT_SHIFTS} {where}{orderBy}", [*params, numRows]
+            else:
+                query, batchParams = f"{SQL_SELECT_SHIFTS} {where}{afterKey}{orderBy}", [*params, *lastKey, numRows]
+
+            with self.connection() as conn:
+                rows = conn.execute(query, batchParams).fetchall()
+
+            for row in rows:
+                yield WorkShift.from_row(row)
+
+            if len(rows) < numRows:
+                break
+            lastKey = (rows[-1][0], rows[-1][1], rows[-1][6])
+            if remaining is not None:
+                remaining -= len(rows)
+
+
+    def query_table(
+        self,
+        minDate: date | None=None,
+        maxDate: date | None=None,
+        rate_type: str | None=None,
+        limit: int | None=None,
+    ) -> ShiftTable:
+        """
+        Same filters as query_shifts, but the rows go straight into a ShiftTable
+        without making a WorkShift per row.
+        """
+        where, params = self.__where(minDate, maxDate, rate_type)
+        query = f"{SQL_SELECT_SHIFTS} {where} ORDER BY s.date, s.clock_in"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        if not rows:
+            return ShiftTable([], [], [])
+
+        days, clockIns, clockOuts, lunchIns, lunchOuts, rateTypes, notes = zip(*rows)
+        rateNames = tuple(dict.fromkeys(rateTypes))
+        rateCodes = {rateType: code for code, rateType in enumerate(rateNames)}
+        return ShiftTable(
+            day=days,
+            clock_in=clockIns,
+            clock_out=clockOuts,
+            lunch_in=lunchIns,
+            lunch_out=lunchOuts,
+            rate_code=[rateCodes[rateType] for rateType in rateTypes],
+            rate_types=rateNames,
+            notes=notes,
+        )
+
+
+    def aggregate(
+        self,
+        minDate: date | None=None,
+        maxDate: date | None=None,
+        rate_type: str | None=None,
+        groupBy: str | None=None,
+    ) -> list[dict]:
+        """
+        Totals computed in SQL: hours, before tax earnings (every shift at the rate of its day) and number of shifts.
+        groupBy: None (one total), 'day' (epoch day), 'month' ('YYYY-MM'), 'year' or 'rate_type'
+        The earnings are rounded per group, so they can differ by cents from summing before_tax_earnings().
+        """
+        where, params = self.__where(minDate, maxDate, rate_type)
+        query = SQL_AGGREGATE_SHIFTS.format(bucket=AGGREGATE_BUCKETS[groupBy], where=where)
+
+        with self.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        return self.__fold_totals(rows)
+
+
+    def __fold_totals(self, rows) -> list[dict]:
+        """
+        (bucket, minutes, earnings, shifts) rows --> one total per bucket
+        """
+        return [
+            {'bucket': bucket, 'hours': minutes / 60, 'earnings': round(earnings, 2), 'shifts': numShifts}
+            for bucket, minutes, earnings, numShifts in rows
+        ]
+
+
+    def __where(self, minDate: date | None, maxDate: date | None, rate_type: str | None) -> tuple[str, list]:
+        where = []
+        params = []
+        if minDate is not None:
+            where.append("s.date >= ?")
+            params.append(minDate.toordinal() - EPOCH_ORDINAL)
+        if maxDate is not None:
+            where.append("s.date <= ?")
+            params.append(maxDate.toordinal() - EPOCH_ORDINAL)
+        if rate_type is not None:
+            where.append("r.name = ?")
+            params.append(rate_type)
+
+        return ("WHERE " + " AND ".join(where) if where else ""), params
+
+
+
+
+
+
+    # =====================================================================
+    #            ROLLUPS
+    # =====================================================================
+    # Hours, earnings and number of shifts per week (ISO, Monday first), month and pay period.
+    # Triggers keep them up to date on every write (see utilities/db_schema.py),
+    # so reading them never scans the shifts.
+
+    def rollups(
+        self,
+        period: str='week',
+        minDate: date | None=None,
+        maxDate: date | None=None,
+        rate_type: str | None=None,
+    ) -> list[dict]:
+        """
+        The totals of every week / month / pay_period that has shifts and overlaps minDate..maxDate, oldest first.
+        Each one: {'period', 'start', 'end' (last day), 'label', 'hours', 'earnings', 'shifts'}
+        """
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown period '{period}', use one of: {', '.join(ROLLUP_PERIODS)}")
+
+        with self.connection() as conn:
+            payPeriod = conn.execute(SQL_SELECT_PAY_PERIOD).fetchone()
+
+            where = []
+            params = [period]
+            if minDate is not None:
+                where.append("AND ro.start >= ?")
+                params.append(self.__period_start(period, minDate, payPeriod))
+            if maxDate is not None:
+                where.append("AND ro.start <= ?")
+                params.append(self.__period_start(period, maxDate, payPeriod))
+            if rate_type is not None:
+                where.append("AND r.name = ?")
+                params.append(rate_type)
+
+            rows = conn.execute(SQL_SELECT_ROLLUPS.format(where=" ".join(where)), params).fetchall()
+
+        totals = self.__fold_totals(rows)
+        for total in totals:
+            start = date.fromordinal(total.pop('bucket') + EPOCH_ORDINAL)
+            total.update(self.__period_bounds(period, start, payPeriod))
+        return totals
+
+
+    def rollup_for(self, period: str, day: date, rate_type: str | None=None) -> dict:
+        """
+        The totals of the one week / month / pay_period that day falls in (zeros if there are no shifts).
+        """
+        totals = self.rollups(period, minDate=day, maxDate=day, rate_type=rate_type)
+        if totals:
+            return totals[0]
+
+        with self.connection() as conn:
+            payPeriod = conn.execute(SQL_SELECT_PAY_PERIOD).fetchone()
+        start = date.fromordinal(self.__period_start(period, day, payPeriod) + EPOCH_ORDINAL)
+        return {'hours': 0.0, 'earnings': 0.0, 'shifts': 0, **self.__period_bounds(period, start, payPeriod)}
+
+
+    def get_rate_history(self) -> RateHistory:
+        """
+        The pay rates the db prices the rollups with.
+        """
+        with self.connection() as conn:
+            return RateHistory.from_rows(conn.execute(SQL_SELECT_PAY_RATES))
+
+
+    def set_pay_rate(self, rate_type: str, start: date, rate: float) -> RateHistory:
+        """
+        Add a rate (e.g. a raise, from its first day on) or change the one starting on that day,
+        and re-price the rollups. Returns the new history, which the shifts are priced with from now on.
+        """
+        with self.connection() as conn:
+            with conn:
+                self.__insert_rate_types(conn, {rate_type})
+                conn.execute(SQL_DELETE_PAY_RATE, (rate_type, to_epoch_day(start)))
+                conn.execute(SQL_INSERT_PAY_RATE, (rate_type, to_epoch_day(start), float(rate)))
+            run_script(conn, rollup_rebuild_sql())
+            history = RateHistory.from_rows(conn.execute(SQL_SELECT_PAY_RATES))
+
+        use_rate_history(history)
+        return history
+
+
+    def get_pay_period(self) -> tuple[date, int]:
+        """
+        (first day of one pay period, length in days)
+        """
+        with self.connection() as conn:
+            anchor, days = conn.execute(SQL_SELECT_PAY_PERIOD).fetchone()
+        return date.fromordinal(anchor + EPOCH_ORDINAL), days
+
+
+    def set_pay_period(self, anchor: date, days: int=14) -> None:
+        """
+        Move the pay periods (anchor is the first day of any one of them) and recompute their rollups.
+        """
+        if days < 1:
+            raise ValueError(f"A pay period has to be at least one day long, got {days}")
+
+        # one script, so the new pay period and its rollups are committed together
+        updatePayPeriod = SQL_UPDATE_PAY_PERIOD.format(anchor=anchor.toordinal() - EPOCH_ORDINAL, days=int(days))
+        with self.connection() as conn:
+            run_script(conn, f"{updatePayPeriod};\n{rollup_rebuild_sql(('pay_period',))}")
+
+
+    def rebuild_rollups(self) -> None:
+        """
+        Recompute every rollup from the shifts. Only needed if the shifts were edited by hand, outside ShiftStore.
+        """
+        with self.connection() as conn:
+            run_script(conn, rollup_rebuild_sql())
+
+
+    def __period_start(self, period: str, day: date, payPeriod: tuple[int, int]) -> int:
+        epochDay = day.toordinal() - EPOCH_ORDINAL
+        if period == 'week':
+            return epochDay - (epochDay + 3) % 7
+        if period == 'month':
+            return day.replace(day=1).toordinal() - EPOCH_ORDINAL
+
+        anchor, days = payPeriod
+        return epochDay - (epochDay - anchor) % days
+
+
+    def __period_bounds(self, period: str, start: date, payPeriod: tuple[int, int]) -> dict:
+        if period == 'week':
+            end = start + timedelta(days=6)
+            year, week, _ = start.isocalendar()
+            label = f"{year}-W{week:02d}"
+        elif period == 'month':
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            label = f"{start:%Y-%m}"
+        else:
+            end = start + timedelta(days=payPeriod[1] - 1)
+            label = f"{start:%b %d} - {end:%b %d %Y}"
+
+        return {'period': period, 'start': start, 'end': end, 'label': label}
+
+
+
+
+
+
+    # =====================================================================
+    #            SHEET SYNC BOOKKEEPING
+    # =====================================================================
+
+    def get_checkpoint(self, sheetName: str) -> str | None:
+        """
+        The sheet revision that was last synced.
+        """
+        with self.connection() as conn:
+            row = conn.execute(SQL_SELECT_CHECKPOINT, (sheetName,)).fetchone()
+        return row[0] if row else None
+
+
+    def get_sheet_rows(self, sheetName: str) -> dict[int, tuple]:
+        """
+        {row number: (content hash, epoch day, clock in, notes)} of the last sync
+        """
+        with self.connection() as conn:
+            return {row[0]: row[1:] for row in conn.execute(SQL_SELECT_SHEET_ROWS, (sheetName,))}
+
+
+    def apply_sheet_changes(
+        self,
+        sheetName: str,
+        revision: str | None,
+        rowCount: int,
+        syncedAt: str,
+        changedRows: dict[int, tuple[str, WorkShift]],
+        removedRows: list[int],
+    ) -> None:
+        """
+        In one transaction: drop the old version of every changed/removed row, upsert the
+        new shifts, remember each row's hash and save the checkpoint.
+        changedRows: {row number: (content hash, shift)}
+        """
+        storedRows = self.get_sheet_rows(sheetName)
+
+        with self.connection() as conn, conn:
+            oldKeys = [storedRows[rowNumber][1:] for rowNumber in removedRows + list(changedRows) if rowNumber in storedRows]
+            conn.executemany(SQL_DELETE_SHIFT, oldKeys)
+            conn.executemany(SQL_DELETE_SHEET_ROW, [(sheetName, rowNumber) for rowNumber in removedRows])
+
+            self.__insert_rate_types(conn, {shift.rate_type for _, shift in changedRows.values()})
+            dbRows = {rowNumber: shift_to_db_row(shift) for rowNumber, (_, shift) in changedRows.items()}
+            conn.executemany(SQL_UPSERT_SHIFT, dbRows.values())
+            conn.executemany(
+                SQL_SAVE_SHEET_ROW,
+                [
+                    (sheetName, rowNumber, contentHash, dbRows[rowNumber][0], dbRows[rowNumber][1], dbRows[rowNumber][6])
+                    for rowNumber, (contentHash, _) in changedRows.items()
+                ]
+            )
+
+            conn.execute(SQL_SAVE_CHECKPOINT, (sheetName, revision, rowCount, syncedAt))
+            self.__refresh_rollups(conn, [key[0] for key in oldKeys] + [row[0] for row in dbRows.values()])
+
+
+
+
+
+
+
+
+
+
+def shift_to_db_key(shift: WorkShift) -> tuple:
+    """
+    The natural key as the db stores it: (epoch day, clock in, notes)
+    """
+    row = shift_to_db_row(shift)
+    return row[0], row[1], row[6]
@@ -0,0 +1,329 @@
+# shift table class
+import numpy as np
+from datetime import date
+
+# user modules
+from classes.shiftClass import WorkShift, EPOCH_ORDINAL
+from classes.rateHistoryClass import RateHistory, active_rate_history
+
+MINUTES_PER_DAY = 24 * 60
+
+
+
+
+
+class ShiftTable:
+    """
+    Columnar container of shifts.
+    Every column is a NumPy array of the same length, so the math runs on all
+    the shifts at once instead of looping over WorkShift objects.
+
+    Columns:
+    - day:          epoch days (days since 1970-01-01)
+    - clock_in:     minutes since midnight
+    - clock_out:    minutes since midnight
+    - lunch_in:     minutes since midnight (60 = the time(1) "skipped lunch" default)
+    - lunch_out:    minutes since midnight (60 = the time(1) "skipped lunch" default)
+    - rate_code:    index into self.rate_types
+    - notes:        stored as one string + offsets into it
+    """
+
+    def __init__(
+        self,
+        day,
+        clock_in,
+        clock_out,
+        lunch_in=None,
+        lunch_out=None,
+        rate_code=None,
+        rate_types: tuple[str, ...] = ('staples copy center',),
+        notes: list[str] | None = None,
+    ):
+        self._day = np.asarray(day, dtype=np.int32)
+        numShifts = len(self._day)
+
+        self._clock_in = np.asarray(clock_in, dtype=np.int16)
+        self._clock_out = np.asarray(clock_out, dtype=np.int16)
+        self._lunch_in = np.full(numShifts, 60, dtype=np.int16) if lunch_in is None else np.asarray(lunch_in, dtype=np.int16)
+        self._lunch_out = np.full(numShifts, 60, dtype=np.int16) if lunch_out is None else np.asarray(lunch_out, dtype=np.int16)
+        self._rate_code = np.zeros(numShifts, dtype=np.int16) if rate_code is None else np.asarray(rate_code, dtype=np.int16)
+        self._rate_types = tuple(rate_types)
+
+        # notes are kept as one long string and the offsets of each note in it
+        notes = [''] * numShifts if notes is None else [note or '' for note in notes]
+        self._notes_text = ''.join(notes)
+        self._notes_offsets = np.zeros(numShifts + 1, dtype=np.int64)
+        np.cumsum([len(note) for note in notes], out=self._notes_offsets[1:])
+
+        for name, col in self.columns.items():
+            if len(col) != numShifts:
+                raise ValueError(f"Column '{name}' has {len(col)} values, expected {numShifts}")
+
+
+    @property
+    def day(self):
+        return self._day
+
+    @property
+    def clock_in(self):
+        return self._clock_in
+
+    @property
+    def clock_out(self):
+        return self._clock_out
+
+    @property
+    def lunch_in(self):
+        return self._lunch_in
+
+    @property
+    def lunch_out(self):
+        return self._lunch_out
+
+    @property
+    def rate_code(self):
+        return self._rate_code
+
+    @property
+    def rate_types(self):
+        return self._rate_types
+
+    @property
+    def notes(self) -> list[str]:
+        offsets = self._notes_offsets
+        return [self._notes_text[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+    @property
+    def columns(self) -> dict[str, np.ndarray]:
+        return {
+            'day': self._day,
+            'clock_in': self._clock_in,
+            'clock_out': self._clock_out,
+            'lunch_in': self._lunch_in,
+            'lunch_out': self._lunch_out,
+            'rate_code': self._rate_code,
+        }
+
+    @property
+    def dates(self) -> np.ndarray:
+        """
+        The shift dates as numpy datetime64[D] values (handy for matplotlib).
+        """
+        return self._day.astype('datetime64[D]')
+
+
+
+
+
+
+    @classmethod
+    def from_shifts(cls, shifts: list[WorkShift]) -> 'ShiftTable':
+        """
+        Build the table from a list of WorkShift objects.
+        """
+        rateTypes = []
+        rateCodes = {}
+        codes = []
+        for shift in shifts:
+            if shift.rate_type not in rateCodes:
+                rateCodes[shift.rate_type] = len(rateTypes)
+                rateTypes.append(shift.rate_type)
+            codes.append(rateCodes[shift.rate_type])
+
+        # WorkShift already keeps its times as minutes since midnight
+        minutes = np.array([shift.minutes for shift in shifts], dtype=np.int16).reshape(-1, 4)
+
+        return cls(
+            day=[shift.date.toordinal() - EPOCH_ORDINAL for shift in shifts],
+            clock_in=minutes[:, 0],
+            clock_out=minutes[:, 1],
+            lunch_in=minutes[:, 2],
+            lunch_out=minutes[:, 3],
+            rate_code=codes,
+            rate_types=tuple(rateTypes) or ('staples copy center',),
+            notes=[shift.notes for shift in shifts],
+        )
+
+
+    def to_shifts(self) -> list[WorkShift]:
+        """
+        Turn the table back into a list of WorkShift objects.
+        """
+        return [self[i] for i in range(len(self))]
+
+
+    @classmethod
+    def concat(cls, tables: list['ShiftTable']) -> 'ShiftTable':
+        """
+        Stack several tables into one. The rate codes are remapped onto one shared list of rate types.
+        """
+        rateTypes = []
+        for table in tables:
+            rateTypes += [rateType for rateType in table.rate_types if rateType not in rateTypes]
+
+        rateCodes = []
+        for table in tables:
+            remap = np.array([rateTypes.index(rateType) for rateType in table.rate_types], dtype=np.int16)
+            rateCodes.append(remap[table.rate_code])
+
+        return cls(
+            day=np.concatenate([table.day for table in tables]) if tables else [],
+            clock_in=np.concatenate([table.clock_in for table in tables]) if tables else [],
+            clock_out=np.concatenate([table.clock_out for table in tables]) if tables else [],
+            lunch_in=np.concatenate([table.lunch_in for table in tables]) if tables else [],
+            lunch_out=np.concatenate([table.lunch_out for table in tables]) if tables else [],
+            rate_code=np.concatenate(rateCodes) if tables else [],
+            rate_types=tuple(rateTypes) or ('staples copy center',),
+            notes=[note for table in tables for note in table.notes],
+        )
+
+
+
+
+
+
+    def __len__(self):
+        return len(self._day)
+
+
+    def __getitem__(self, key):
+        """
+        table[i]            --> WorkShift
+        table[2:10]         --> ShiftTable
+        table[mask]         --> ShiftTable (boolean mask)
+        table[[0, 4, 7]]    --> ShiftTable (integer indices)
+        """
+        if isinstance(key, (int, np.integer)):
+            return self.__shift_at(int(key))
+
+        indices = np.arange(len(self))[key]
+        notes = self.notes
+        return ShiftTable(
+            day=self._day[indices],
+            clock_in=self._clock_in[indices],
+            clock_out=self._clock_out[indices],
+            lunch_in=self._lunch_in[indices],
+            lunch_out=self._lunch_out[indices],
+            rate_code=self._rate_code[indices],
+            rate_types=self._rate_types,
+            notes=[notes[i] for i in indices],
+        )
+
+
+    def __shift_at(self, i: int) -> WorkShift:
+        if i < 0:
+            i += len(self)
+        return WorkShift(
+            date=date.fromordinal(int(self._day[i]) + EPOCH_ORDINAL),
+            clock_in=int(self._clock_in[i]),
+            clock_out=int(self._clock_out[i]),
+            lunch_in=int(self._lunch_in[i]),
+            lunch_out=int(self._lunch_out[i]),
+            rate_type=self._rate_types[self._rate_code[i]],
+            notes=self._notes_text[self._notes_offsets[i]:self._notes_offsets[i + 1]],
+        )
+
+
+    def __repr__(self):
+        return f"<ShiftTable {len(self)} shifts, {self.hours_worked().sum():.2f} hrs, ${self.before_tax_earnings().sum():.2f}>"
+
+
+
+
+
+
+    def filter(self, minDate: date | None = None, maxDate: date | None = None, rate_type: str | None = None) -> 'ShiftTable':
+        """
+        Keep the shifts strictly between minDate and maxDate (same rule as ShiftManager.plot)
+        and optionally only the ones with the given rate type.
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        if minDate is not None:
+            mask &= self._day > minDate.toordinal() - EPOCH_ORDINAL
+        if maxDate is not None:
+            mask &= self._day < maxDate.toordinal() - EPOCH_ORDINAL
+        if rate_type is not None:
+            if rate_type not in self._rate_types:
+                mask[:] = False
+            else:
+                mask &= self._rate_code == self._rate_types.index(rate_type)
+
+        return self[mask]
+
+
+    def sort(self) -> 'ShiftTable':
+        """
+        Sorted by date, then clock in.
+        """
+        return self[np.lexsort((self._clock_in, self._day))]
+
+
+    def bins(self, period: str='week') -> dict[str, np.ndarray]:
+        """
+        Groups the shifts into calendar weeks (Monday first) or months, all at once.
+        One entry per bin that has shifts, in date order:
+        - start, end:           epoch days (end is exclusive)
+        - shifts:               number of shifts
+        - hours:                total hours worked
+        - clock_in, clock_out:  earliest clock in and latest clock out (minutes since midnight)
+        """
+        day = self._day.astype(np.int64)
+        if period == 'week':
+            start = day - (day + 3) % 7 # 1970-01-01 was a Thursday
+            end = start + 7
+        elif period == 'month':
+            months = self.dates.astype('datetime64[M]')
+            start = months.astype('datetime64[D]').astype(np.int64)
+            end = (months + 1).astype('datetime64[D]').astype(np.int64)
+        else:
+            raise ValueError(f"Unknown period '{period}', use 'week' or 'month'")
+
+        if not len(self):
+            empty = np.array([], dtype=np.int64)
+            return {'start': empty, 'end': empty, 'shifts': empty, 'hours': np.array([]), 'clock_in': empty, 'clock_out': empty}
+
+        # sort once, then every group by is a reduceat over the first row of each bin
+        order = np.argsort(start, kind='stable')
+        sortedStart = start[order]
+        firsts = np.flatnonzero(np.r_[True, sortedStart[1:] != sortedStart[:-1]])
+
+        return {
+            'start': sortedStart[firsts],
+            'end': end[order][firsts],
+            'shifts': np.diff(np.r_[firsts, len(order)]),
+            'hours': np.add.reduceat(self.hours_worked()[order], firsts),
+            'clock_in': np.minimum.reduceat(self._clock_in[order], firsts),
+            'clock_out': np.maximum.reduceat(self._clock_out[order], firsts),
+        }
+
+
+
+
+
+
+    def hours_worked(self) -> np.ndarray:
+        shiftLength = self._clock_out.astype(np.int32) - self._clock_in
+        lunch = self._lunch_out.astype(np.int32) - self._lunch_in
+        return (shiftLength - lunch) / 60
+
+
+    @property
+    def hourly_rate(self) -> np.ndarray:
+        return self.hourly_rates()
+
+
+    def hourly_rates(self, rates: RateHistory | None=None) -> np.ndarray:
+        """
+        Every shift's rate on its own day, looked up for all the shifts at once.
+        """
+        if rates is None:
+            rates = active_rate_history()
+        return rates.rates_for(self._rate_types, self._rate_code, self._day)
+
+
+    def before_tax_earnings(self, rates: RateHistory | None=None) -> np.ndarray:
+        """
+        Pass another RateHistory (e.g. active_rate_history().with_rate(...)) to re-price all the shifts.
+        """
+        return np.round(self.hours_worked() * self.hourly_rates(rates), 2)
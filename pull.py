@@ -1,12 +1,14 @@
-from utilities.ut_functions import *
+from classes.shiftManagerClass import ShiftManager
 
 
 
 
 def main():
-    shifts = pullShiftsFromDB()
-    print_shifts(shifts)
+    shiftMngr = ShiftManager()
+    shifts = shiftMngr.pull_shifts_from_db()
+    shiftMngr.print_shifts(shifts)
+    shiftMngr.print_rollups('pay_period')
 
 
 
-main()
\ No newline at end of file
+main()
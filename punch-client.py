@@ -0,0 +1,45 @@
+# Sends punches to the punch daemon (python apple-shortcut-to-visuals.py daemon)
+#
+#   python punch-client.py "Jul 25, 2025 at 4:30 PM\nJul 25, 2025 at 9:00 PM"
+#   echo "..." | python punch-client.py
+#
+# Only the standard library is imported, so this starts in a few milliseconds.
+# Without a daemon running it falls back to apple-shortcut-to-visuals.py punch (slower, but the punch still lands).
+
+import os
+import sys
+from pathlib import Path
+
+from classes.punchDaemonClass import send_to_daemon
+
+
+SCRIPTS_DIR = Path(__file__).parent
+
+
+
+
+def main():
+    punches = sys.argv[1] if len(sys.argv) > 1 else sys.stdin.read()
+    if not punches.strip():
+        print(f"No punches entered.")
+        exit(1)
+
+    try:
+        response = send_to_daemon({'command': 'punch', 'punches': punches})
+    except OSError as e:
+        print(f"The punch daemon didn't answer: {e}")
+        exit(1)
+
+    if response is None:
+        print(f"No punch daemon running, punching without it.")
+        script = str(SCRIPTS_DIR / 'apple-shortcut-to-visuals.py')
+        os.execv(sys.executable, [sys.executable, script, 'punch', punches])
+
+    print(response['message'])
+    exit(0 if response['ok'] else 1)
+
+
+
+
+if __name__ == '__main__':
+    main()
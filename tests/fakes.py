@@ -0,0 +1,76 @@
+# fakes of the Google Sheet objects, enough for GoogleSheetManager to read and write a sheet in memory
+from gspread.utils import a1_range_to_grid_range
+
+from classes.googleSheetClass import GoogleSheetManager
+
+
+HEADER = ['YEAR SELECTOR', 'DATE', 'IN', 'LUNCH IN', 'LUNCH OUT', 'OUT', 'time', 'hours', 'bfr tax est total:']
+
+
+def make_rows(days: list[str]) -> list[list[str]]:
+    """
+    The header and one 9:00 AM - 5:00 PM shift per day, e.g. 'Mon Jul 07' (newest first, like the sheet).
+    """
+    return [list(HEADER)] + [['', day, '9:00 AM', '12:00 PM', '12:30 PM', '5:00 PM', '8:00:00', '7.5', ''] for day in days]
+
+
+class FakeWorksheet:
+    id = 0
+
+    def __init__(self, rows: list[list[str]]):
+        self.rows = rows
+
+    def get_all_values(self):
+        return [list(row) for row in self.rows]
+
+    def row_values(self, rowNumber: int):
+        return list(self.rows[rowNumber - 1])
+
+    def batch_get(self, ranges: list[str]):
+        results = []
+        for a1 in ranges:
+            grid = a1_range_to_grid_range(a1)
+            firstCol, lastCol = grid.get('startColumnIndex', 0), grid.get('endColumnIndex')
+            rows = [row[firstCol:lastCol] for row in self.rows[grid.get('startRowIndex', 0):grid.get('endRowIndex')]]
+            while rows and not any(rows[-1]):
+                rows.pop()
+            results.append(rows)
+        return results
+
+    def batch_update(self, data: list[dict], value_input_option=None):
+        for item in data:
+            grid = a1_range_to_grid_range(item['range'])
+            for i, rowValues in enumerate(item['values']):
+                for j, value in enumerate(rowValues):
+                    self.set(grid['startRowIndex'] + i, grid['startColumnIndex'] + j, value)
+        return {}
+
+    def set(self, rowIndex: int, colIndex: int, value: str) -> None:
+        while len(self.rows) <= rowIndex:
+            self.rows.append([''] * len(HEADER))
+        self.rows[rowIndex][colIndex] = value
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet: FakeWorksheet, key: str):
+        self.id = key
+        self.revision = 'r1'
+        self.sheet1 = worksheet
+
+    def get_lastUpdateTime(self):
+        return self.revision
+
+
+def make_sheet_manager(rows: list[list[str]], key: str, snapshotTtl: float=300) -> GoogleSheetManager:
+    """
+    A GoogleSheetManager on a FakeSpreadsheet, without connecting to anything.
+    """
+    gglSheetManager = GoogleSheetManager.__new__(GoogleSheetManager)
+    gglSheetManager._sheet_name = f"fake {key}"
+    gglSheetManager._worksheet = None
+    gglSheetManager._current_year = '2025'
+    gglSheetManager._snapshot_ttl = snapshotTtl
+    gglSheetManager._snapshot = None
+    gglSheetManager._sheet = FakeWorksheet(rows)
+    gglSheetManager._spreadsheet = FakeSpreadsheet(gglSheetManager._sheet, key)
+    return gglSheetManager
@@ -0,0 +1,42 @@
+import unittest
+from datetime import date
+
+from classes.shiftClass import WorkShift
+from classes.shiftIntervalIndexClass import ShiftIntervalIndex
+from classes.shiftTableClass import ShiftTable
+
+DAY = date(2025, 7, 7)
+
+
+def make_table(*clockInOuts: tuple[int, int]) -> ShiftTable:
+    return ShiftTable.from_shifts([WorkShift(DAY, clockIn, clockOut, notes=f"n{i}") for i, (clockIn, clockOut) in enumerate(clockInOuts)])
+
+
+class KeepMaskTest(unittest.TestCase):
+
+    def test_a_chain_only_drops_the_middle_shift(self):
+        # A 9-12, B 11-14, C 13-16: B overlaps both, A and C don't overlap each other
+        table = make_table((540, 720), (660, 840), (780, 960))
+        self.assertEqual(ShiftIntervalIndex(table).keep_mask().tolist(), [True, False, True])
+
+
+    def test_the_shift_that_starts_first_is_kept(self):
+        table = make_table((780, 960), (660, 840), (540, 720))
+        self.assertEqual(ShiftIntervalIndex(table).keep_mask().tolist(), [True, False, True])
+
+
+    def test_a_chain_of_near_duplicates_keeps_the_overlaps(self):
+        # A~B and B~C are near duplicates, A and C are 20 minutes apart: an overlap, kept with 'keep'
+        table = make_table((540, 1020), (550, 1030), (560, 1040))
+        index = ShiftIntervalIndex(table)
+        self.assertEqual(index.keep_mask(tolerance=15, onOverlap='keep').tolist(), [True, False, True])
+        self.assertEqual(index.keep_mask(tolerance=15, onOverlap='reject').tolist(), [True, False, False])
+
+
+    def test_back_to_back_shifts_are_kept(self):
+        table = make_table((540, 720), (720, 900))
+        self.assertTrue(ShiftIntervalIndex(table).keep_mask().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
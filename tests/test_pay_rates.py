@@ -0,0 +1,54 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+from classes.rateHistoryClass import RATE_HISTORY, active_rate_history, use_rate_history
+from classes.shiftClass import WorkShift
+from classes.shiftStoreClass import ShiftStore
+
+
+class PayRatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpDir.cleanup)
+        self.addCleanup(use_rate_history, RATE_HISTORY)
+        self.dbPath = Path(self.tmpDir.name) / 'database.db'
+
+
+    def open_store(self) -> tuple[ShiftStore, str]:
+        output = io.StringIO()
+        store = ShiftStore(self.dbPath)
+        with contextlib.redirect_stdout(output):
+            store.get_rate_history()
+        self.addCleanup(store.close)
+        return store, output.getvalue()
+
+
+    def test_a_new_db_is_seeded_from_rates_py_quietly(self):
+        store, output = self.open_store()
+        self.assertEqual(store.get_rate_history(), RATE_HISTORY)
+        self.assertNotIn('pay rates', output)
+
+
+    def test_the_db_rates_are_kept_and_price_the_shifts(self):
+        store, _ = self.open_store()
+        store.insert_shifts([WorkShift(date(2025, 8, 4), 540, 1020, rate_type='staples cashier')])
+        store.set_pay_rate('staples cashier', date(2025, 8, 1), 20.00)
+        store.close()
+        use_rate_history(RATE_HISTORY)
+
+        # a new process: rates.py still has the old rate, the db wins
+        store, output = self.open_store()
+        self.assertIn('differ', output)
+        self.assertEqual(active_rate_history().rate_on('staples cashier', date(2025, 8, 4)), 20.00)
+        self.assertEqual(active_rate_history().rate_on('staples cashier', date(2025, 7, 31)), 17.80)
+        self.assertEqual(WorkShift(date(2025, 8, 4), 540, 1020, rate_type='staples cashier').before_tax_earnings(), 160.00)
+        self.assertEqual(store.rollup_for('week', date(2025, 8, 4))['earnings'], 160.00)
+
+
+if __name__ == '__main__':
+    unittest.main()
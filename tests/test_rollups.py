@@ -0,0 +1,77 @@
+import random
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+from classes.shiftClass import WorkShift
+from classes.shiftStoreClass import ShiftStore, shift_to_db_key
+from utilities.db_schema import rollup_rebuild_sql
+
+SQL_ALL_ROLLUPS = "SELECT period, start, rate_type_id, minutes, shifts, ROUND(earnings, 6) FROM rollups ORDER BY 1, 2, 3"
+
+
+def make_shifts(count: int, first: date=date(2000, 1, 1), perDay: int=3, seed: int=0) -> list[WorkShift]:
+    rand = random.Random(seed)
+    return [
+        WorkShift(first + timedelta(days=i // perDay), rand.randrange(400, 700), rand.randrange(800, 1300), notes=f"n{i}")
+        for i in range(count)
+    ]
+
+
+class RollupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpDir.cleanup)
+        self.dbPath = Path(self.tmpDir.name) / 'database.db'
+        self.store = ShiftStore(self.dbPath)
+        self.addCleanup(self.store.close)
+
+
+    def assert_rollups_match_a_rebuild(self):
+        with self.store.connection() as conn:
+            kept = conn.execute(SQL_ALL_ROLLUPS).fetchall()
+
+        # recomputed from scratch on a copy, so the store's own rollups are left alone
+        copy = sqlite3.connect(':memory:')
+        self.addCleanup(copy.close)
+        with self.store.connection() as conn:
+            conn.backup(copy)
+        copy.executescript(rollup_rebuild_sql())
+        self.assertEqual(kept, copy.execute(SQL_ALL_ROLLUPS).fetchall())
+
+
+    def test_rollups_follow_inserts_upserts_and_deletes(self):
+        shifts = make_shifts(300)
+        self.store.insert_shifts(shifts)
+        self.assert_rollups_match_a_rebuild()
+
+        # a longer shift, then a replaced one that moves to another month
+        self.store.upsert_shifts([WorkShift(shifts[0].date, shifts[0].clock_in, 1380, notes=shifts[0].notes)])
+        self.store.insert_shifts([WorkShift(date(2001, 6, 1), 540, 1020, notes='moved')], replaceKeys=[shift_to_db_key(shifts[1])])
+        self.assert_rollups_match_a_rebuild()
+
+        # emptying a whole week leaves no zero rollups behind
+        self.store.delete_shifts([shift_to_db_key(shift) for shift in shifts[:30]])
+        self.assert_rollups_match_a_rebuild()
+        with self.store.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM rollups WHERE shifts = 0").fetchone()[0], 0)
+
+
+    def test_bulk_insert_is_fast(self):
+        shifts = make_shifts(100_000)
+
+        started = time.perf_counter()
+        counts = self.store.insert_shifts(shifts)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(counts['inserted'], 100_000)
+        self.assertLess(elapsed, 1.0)
+        self.assert_rollups_match_a_rebuild()
+
+
+if __name__ == '__main__':
+    unittest.main()
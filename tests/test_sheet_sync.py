@@ -0,0 +1,45 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import classes.googleSheetClass as googleSheetClass
+from classes.shiftManagerClass import ShiftManager
+from tests.fakes import make_rows, make_sheet_manager
+
+
+class SheetSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        snapshotDir = mock.patch.object(googleSheetClass, 'SNAPSHOT_DIR', Path(self.tmpDir.name) / 'sheets')
+        snapshotDir.start()
+        self.addCleanup(snapshotDir.stop)
+        self.addCleanup(self.tmpDir.cleanup)
+
+        self.dbPath = Path(self.tmpDir.name) / 'database.db'
+        self.shiftMngr = ShiftManager()
+        self.addCleanup(self.shiftMngr.close)
+
+
+    def test_edit_within_the_snapshot_ttl_is_synced(self):
+        gglSheetManager = make_sheet_manager(make_rows(['Mon Jul 07', 'Sun Jul 06']), key='ttl', snapshotTtl=300)
+        counts = self.shiftMngr.sync_sheet_to_db(gglSheetManager, dbPath=self.dbPath)
+        self.assertEqual(counts['inserted'], 2)
+
+        # edited in the sheet while the snapshot in memory is still fresh
+        gglSheetManager.sheet.rows[1][8] = 'edited note'
+        gglSheetManager.spreadsheet.revision = 'r2'
+
+        counts = self.shiftMngr.sync_sheet_to_db(gglSheetManager, dbPath=self.dbPath)
+        self.assertEqual(counts['updated'], 1)
+        notes = [shift.notes for shift in self.shiftMngr.pull_shifts_from_db(self.dbPath)]
+        self.assertIn('edited note', notes)
+
+        # and the checkpoint is of the revision that was read, so nothing is left to sync
+        counts = self.shiftMngr.sync_sheet_to_db(gglSheetManager, dbPath=self.dbPath)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,435 @@
+# db_schema.py
+# The SQLite schema of database.db and the migrations between its versions.
+# The version lives in PRAGMA user_version.
+import sqlite3
+from datetime import date
+
+from utilities.rates import PAY_PERIOD_ANCHOR, PAY_PERIOD_DAYS
+
+
+SCHEMA_VERSION = 5
+
+
+
+# ---------------------------------------------------------------------
+# version 1: everything stored as TEXT ('2025-07-25', '16:30:00')
+# ---------------------------------------------------------------------
+SCHEMA_V1 = """
+    CREATE TABLE IF NOT EXISTS shifts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        clock_in TEXT,
+        clock_out TEXT,
+        lunch_in TEXT,
+        lunch_out TEXT,
+        rate_type TEXT,
+        notes TEXT,
+        UNIQUE(date, clock_in, notes)
+    );
+
+    CREATE TABLE IF NOT EXISTS sheet_rows (
+        sheet_name TEXT,
+        row_number INTEGER,
+        content_hash TEXT,
+        date TEXT,
+        clock_in TEXT,
+        notes TEXT,
+        PRIMARY KEY(sheet_name, row_number)
+    );
+
+    CREATE TABLE IF NOT EXISTS sync_checkpoints (
+        sheet_name TEXT PRIMARY KEY,
+        revision TEXT,
+        row_count INTEGER,
+        synced_at TEXT
+    );
+"""
+
+
+
+# ---------------------------------------------------------------------
+# version 2: typed
+#   date        --> INTEGER epoch day (days since 1970-01-01)
+#   times       --> INTEGER minutes since midnight (60 = the time(1) "skipped lunch" default)
+#   rate_type   --> rate_type_id into the rate_types lookup table
+#   notes       --> NOT NULL, '' when empty (NULLs never collide in a UNIQUE index)
+# ---------------------------------------------------------------------
+SCHEMA_V2 = """
+    CREATE TABLE IF NOT EXISTS rate_types (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+
+    CREATE TABLE IF NOT EXISTS shifts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date INTEGER NOT NULL,
+        clock_in INTEGER NOT NULL,
+        clock_out INTEGER NOT NULL,
+        lunch_in INTEGER NOT NULL DEFAULT 60,
+        lunch_out INTEGER NOT NULL DEFAULT 60,
+        rate_type_id INTEGER NOT NULL REFERENCES rate_types(id),
+        notes TEXT NOT NULL DEFAULT ''
+    );
+
+    -- the date index is also the natural key of a shift
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_shifts_date ON shifts(date, clock_in, notes);
+    CREATE INDEX IF NOT EXISTS idx_shifts_rate_type_date ON shifts(rate_type_id, date);
+
+    CREATE TABLE IF NOT EXISTS sheet_rows (
+        sheet_name TEXT NOT NULL,
+        row_number INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        date INTEGER NOT NULL,
+        clock_in INTEGER NOT NULL,
+        notes TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY(sheet_name, row_number)
+    );
+
+    CREATE TABLE IF NOT EXISTS sync_checkpoints (
+        sheet_name TEXT PRIMARY KEY,
+        revision TEXT,
+        row_count INTEGER,
+        synced_at TEXT
+    );
+"""
+
+
+# 'YYYY-MM-DD' --> epoch day, 'HH:MM:SS' --> minutes since midnight
+SQL_EPOCH_DAY = "CAST(julianday({col}) - 2440587.5 AS INTEGER)"
+SQL_MINUTES = "(CAST(substr({col}, 1, 2) AS INTEGER) * 60 + CAST(substr({col}, 4, 2) AS INTEGER))"
+
+
+MIGRATE_V1_TO_V2 = f"""
+    ALTER TABLE shifts RENAME TO shifts_v1;
+    ALTER TABLE sheet_rows RENAME TO sheet_rows_v1;
+    ALTER TABLE sync_checkpoints RENAME TO sync_checkpoints_v1;
+
+    {SCHEMA_V2}
+
+    INSERT OR IGNORE INTO rate_types (name)
+        SELECT DISTINCT COALESCE(NULLIF(TRIM(rate_type), ''), 'staples copy center') FROM shifts_v1;
+
+    INSERT OR IGNORE INTO shifts (date, clock_in, clock_out, lunch_in, lunch_out, rate_type_id, notes)
+        SELECT
+            {SQL_EPOCH_DAY.format(col='s.date')},
+            {SQL_MINUTES.format(col='s.clock_in')},
+            {SQL_MINUTES.format(col='s.clock_out')},
+            COALESCE({SQL_MINUTES.format(col='s.lunch_in')}, 60),
+            COALESCE({SQL_MINUTES.format(col='s.lunch_out')}, 60),
+            r.id,
+            COALESCE(s.notes, '')
+        FROM shifts_v1 s
+        JOIN rate_types r ON r.name = COALESCE(NULLIF(TRIM(s.rate_type), ''), 'staples copy center')
+        WHERE s.date IS NOT NULL AND s.clock_in IS NOT NULL AND s.clock_out IS NOT NULL
+        ORDER BY s.id;
+
+    INSERT OR IGNORE INTO sheet_rows (sheet_name, row_number, content_hash, date, clock_in, notes)
+        SELECT sheet_name, row_number, content_hash,
+            {SQL_EPOCH_DAY.format(col='date')},
+            {SQL_MINUTES.format(col='clock_in')},
+            COALESCE(notes, '')
+        FROM sheet_rows_v1;
+
+    INSERT INTO sync_checkpoints SELECT * FROM sync_checkpoints_v1;
+
+    DROP TABLE shifts_v1;
+    DROP TABLE sheet_rows_v1;
+    DROP TABLE sync_checkpoints_v1;
+"""
+
+
+# ---------------------------------------------------------------------
+# version 3: rollups
+#   hours (as minutes) and number of shifts per week / month / pay period and rate type,
+#   kept up to date by triggers on every insert, update and delete of a shift (until version 5).
+# ---------------------------------------------------------------------
+ROLLUP_PERIODS = ('week', 'month', 'pay_period')
+
+# first epoch day of the week / month / pay period that {day} falls in
+# (((x % n) + n) % n is a floor modulo: SQLite's % keeps the sign of x)
+ROLLUP_PERIOD_STARTS = {
+    'week': "{day} - ((({day} + 3) % 7) + 7) % 7", # ISO weeks start on Monday, 1970-01-01 was a Thursday
+    'month': "CAST(julianday({day} * 86400, 'unixepoch', 'start of month') - 2440587.5 AS INTEGER)",
+    'pay_period': "(SELECT {day} - ((({day} - anchor) % days) + days) % days FROM pay_period)",
+}
+
+SQL_MINUTES_WORKED = "(({row}.clock_out - {row}.clock_in) - ({row}.lunch_out - {row}.lunch_in))"
+
+# what the rollups add up: column : (type, value of one shift {row})
+ROLLUP_MEASURES_V3 = {
+    'minutes': ('INTEGER', SQL_MINUTES_WORKED),
+    'shifts': ('INTEGER', "1"),
+}
+
+
+def _rollup_trigger_body(row: str, sign: str, measures: dict) -> str:
+    """
+    Adds (sign '+') or takes away (sign '-') one shift row from its three rollups.
+    """
+    columns = ", ".join(measures)
+    values = ", ".join(f"{sign}{value.format(row=row)}" for _, value in measures.values())
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in measures)
+    return "\n".join(f"""
+        INSERT INTO rollups (period, start, rate_type_id, {columns})
+            VALUES ('{period}', {start.format(day=f'{row}.date')}, {row}.rate_type_id, {values})
+            ON CONFLICT(period, start, rate_type_id) DO UPDATE SET {updates};"""
+        for period, start in ROLLUP_PERIOD_STARTS.items()
+    )
+
+
+def _rollup_table(measures: dict) -> str:
+    columns = "\n".join(f"{column} {columnType} NOT NULL," for column, (columnType, _) in measures.items())
+    return f"""
+        CREATE TABLE IF NOT EXISTS rollups (
+            period TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            rate_type_id INTEGER NOT NULL REFERENCES rate_types(id),
+            {columns}
+            PRIMARY KEY(period, start, rate_type_id)
+        ) WITHOUT ROWID;
+    """
+
+
+def _rollup_schema(measures: dict) -> str:
+    """
+    The rollups table and the triggers that kept it up to date (versions 3 and 4).
+    """
+    return f"""
+        {_rollup_table(measures)}
+
+        CREATE TRIGGER IF NOT EXISTS trg_shifts_rollup_insert AFTER INSERT ON shifts BEGIN
+            {_rollup_trigger_body('NEW', '+', measures)}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_shifts_rollup_update AFTER UPDATE ON shifts BEGIN
+            {_rollup_trigger_body('OLD', '-', measures)}
+            {_rollup_trigger_body('NEW', '+', measures)}
+            DELETE FROM rollups WHERE shifts = 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_shifts_rollup_delete AFTER DELETE ON shifts BEGIN
+            {_rollup_trigger_body('OLD', '-', measures)}
+            DELETE FROM rollups WHERE shifts = 0;
+        END;
+    """
+
+
+SCHEMA_PAY_PERIOD = f"""
+    CREATE TABLE IF NOT EXISTS pay_period (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        anchor INTEGER NOT NULL,
+        days INTEGER NOT NULL
+    );
+
+    INSERT OR IGNORE INTO pay_period (id, anchor, days)
+        VALUES (1, {(PAY_PERIOD_ANCHOR - date(1970, 1, 1)).days}, {PAY_PERIOD_DAYS});
+"""
+
+
+
+# ---------------------------------------------------------------------
+# version 4: pay rate history
+#   pay_rates holds every rate type's rates by first day (filled from utilities/rates.py when empty,
+#   then kept by ShiftStore.set_pay_rate), and the rollups add up the earnings too,
+#   every shift priced at the rate of its own day.
+# ---------------------------------------------------------------------
+SCHEMA_PAY_RATES = """
+    CREATE TABLE IF NOT EXISTS pay_rates (
+        rate_type_id INTEGER NOT NULL REFERENCES rate_types(id),
+        start INTEGER NOT NULL,     -- epoch day the rate applies from
+        rate REAL NOT NULL,
+        PRIMARY KEY(rate_type_id, start)
+    ) WITHOUT ROWID;
+"""
+
+# the rate of {row}'s rate type on {row}'s day (0 without one), a single seek in the primary key
+SQL_RATE_ON = """COALESCE((
+    SELECT p.rate FROM pay_rates p
+    WHERE p.rate_type_id = {row}.rate_type_id AND p.start <= {row}.date
+    ORDER BY p.start DESC LIMIT 1
+), 0)"""
+
+ROLLUP_MEASURES = {
+    **ROLLUP_MEASURES_V3,
+    'earnings': ('REAL', f"({SQL_MINUTES_WORKED} * {SQL_RATE_ON} / 60.0)"),
+}
+
+
+def rollup_rebuild_sql(periods: tuple[str, ...]=ROLLUP_PERIODS, measures: dict=ROLLUP_MEASURES) -> str:
+    """
+    Recomputes the rollups of the given periods from scratch (after a pay period or rate change, or to repair them).
+    """
+    columns = ", ".join(measures)
+    sums = ", ".join(f"SUM({value.format(row='s')})" for _, value in measures.values())
+    deletes = "\n".join(f"DELETE FROM rollups WHERE period = '{period}';" for period in periods)
+    inserts = "\n".join(f"""
+        INSERT INTO rollups (period, start, rate_type_id, {columns})
+            SELECT '{period}', {ROLLUP_PERIOD_STARTS[period].format(day='s.date')}, s.rate_type_id, {sums}
+            FROM shifts s
+            GROUP BY 2, 3;"""
+        for period in periods
+    )
+    return f"{deletes}\n{inserts}"
+
+
+MIGRATE_V2_TO_V3 = f"""
+    {SCHEMA_PAY_PERIOD}
+    {_rollup_schema(ROLLUP_MEASURES_V3)}
+    {rollup_rebuild_sql(measures=ROLLUP_MEASURES_V3)}
+"""
+
+# the rollups are rebuilt with an earnings column
+# (pay_rates starts empty: ShiftStore fills it from utilities/rates.py and rebuilds the rollups again)
+MIGRATE_V3_TO_V4 = f"""
+    DROP TRIGGER trg_shifts_rollup_insert;
+    DROP TRIGGER trg_shifts_rollup_update;
+    DROP TRIGGER trg_shifts_rollup_delete;
+    DROP TABLE rollups;
+
+    {SCHEMA_PAY_RATES}
+    {_rollup_schema(ROLLUP_MEASURES)}
+    {rollup_rebuild_sql()}
+"""
+
+
+
+
+# ---------------------------------------------------------------------
+# version 5: no rollup triggers
+#   three upserts and a pay rate lookup per written row (and a scan of the whole rollups table
+#   per update / delete) made bulk writes 3x slower. ShiftStore now refreshes the rollups once
+#   per write, set-based, for the periods of the days it touched (ROLLUP_REFRESH_SQL).
+# ---------------------------------------------------------------------
+MIGRATE_V4_TO_V5 = """
+    DROP TRIGGER IF EXISTS trg_shifts_rollup_insert;
+    DROP TRIGGER IF EXISTS trg_shifts_rollup_update;
+    DROP TRIGGER IF EXISTS trg_shifts_rollup_delete;
+"""
+
+SCHEMA_V5 = f"""
+    {SCHEMA_V2}
+    {SCHEMA_PAY_PERIOD}
+    {SCHEMA_PAY_RATES}
+    {_rollup_table(ROLLUP_MEASURES)}
+"""
+
+# the end (exclusive) of the week / month / pay period that {day} falls in
+ROLLUP_PERIOD_ENDS = {
+    'week': f"({ROLLUP_PERIOD_STARTS['week']}) + 7",
+    'month': "CAST(julianday({day} * 86400, 'unixepoch', 'start of month', '+1 month') - 2440587.5 AS INTEGER)",
+    'pay_period': f"({ROLLUP_PERIOD_STARTS['pay_period']}) + (SELECT days FROM pay_period)",
+}
+
+# the days a write touched go in temp.rollup_days, then every rollup of their periods is recomputed:
+# their shifts are summed in one GROUP BY (a range scan of the date index per period) and upserted,
+# and what is left at zero of those periods' keys (nothing worked at that rate anymore) is deleted
+SQL_CREATE_ROLLUP_DAYS = (
+    "CREATE TEMP TABLE IF NOT EXISTS rollup_days (day INTEGER PRIMARY KEY)",
+    "CREATE TEMP TABLE IF NOT EXISTS rollup_periods (period TEXT NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL, PRIMARY KEY(period, start))",
+)
+SQL_INSERT_ROLLUP_DAY = "INSERT OR IGNORE INTO temp.rollup_days (day) VALUES (?)"
+
+def _rollup_refresh_sql(measures: dict) -> list[str]:
+    columns = ", ".join(measures)
+    sums = ", ".join(f"SUM({value.format(row='s')})" for _, value in measures.values())
+    zeros = ", ".join(f"{column} = 0" for column in measures)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in measures)
+    return [
+        *(f"""
+            INSERT OR IGNORE INTO temp.rollup_periods (period, start, end)
+                SELECT '{period}', {ROLLUP_PERIOD_STARTS[period].format(day='day')}, {ROLLUP_PERIOD_ENDS[period].format(day='day')}
+                FROM temp.rollup_days"""
+            for period in ROLLUP_PERIODS
+        ),
+        f"""
+            UPDATE rollups SET {zeros}
+                WHERE (period, start) IN (SELECT period, start FROM temp.rollup_periods)""",
+        f"""
+            INSERT INTO rollups (period, start, rate_type_id, {columns})
+                SELECT t.period, t.start, s.rate_type_id, {sums}
+                FROM temp.rollup_periods t
+                JOIN shifts s ON s.date >= t.start AND s.date < t.end
+                GROUP BY t.period, t.start, s.rate_type_id
+                ON CONFLICT(period, start, rate_type_id) DO UPDATE SET {updates}""",
+        """
+            DELETE FROM rollups
+                WHERE (period, start) IN (SELECT period, start FROM temp.rollup_periods) AND shifts = 0""",
+        "DELETE FROM temp.rollup_days",
+        "DELETE FROM temp.rollup_periods",
+    ]
+
+ROLLUP_REFRESH_SQL = _rollup_refresh_sql(ROLLUP_MEASURES)
+
+
+MIGRATIONS = {
+    # from version : script that upgrades it to version + 1
+    1: MIGRATE_V1_TO_V2,
+    2: MIGRATE_V2_TO_V3,
+    3: MIGRATE_V3_TO_V4,
+    4: MIGRATE_V4_TO_V5,
+}
+
+
+
+
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    0 = empty db, 1 = the original all-TEXT schema (it never set user_version), 2+ = typed
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version:
+        return version
+
+    hasShifts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='shifts'"
+    ).fetchone()
+    return 1 if hasShifts else 0
+
+
+
+
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the db up to SCHEMA_VERSION, in place. Every step runs in its own transaction.
+    Returns the version the db is at now.
+    """
+    version = get_schema_version(conn)
+
+    if version == SCHEMA_VERSION:
+        return version
+
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION}).")
+
+    if version == 0:
+        run_script(conn, f"{SCHEMA_V5}\nPRAGMA user_version = {SCHEMA_VERSION};")
+        return SCHEMA_VERSION
+
+    while version < SCHEMA_VERSION:
+        print(f"Migrating the database from schema version {version} to {version + 1} ...")
+        if version == 1:
+            conn.executescript(SCHEMA_V1)  # older dbs might be missing the sync tables
+        run_script(conn, f"{MIGRATIONS[version]}\nPRAGMA user_version = {version + 1};")
+        version += 1
+
+    return version
+
+
+
+
+
+
+def run_script(conn: sqlite3.Connection, script: str) -> None:
+    """
+    executescript() commits on its own, so the BEGIN/COMMIT is part of the script.
+    """
+    try:
+        conn.executescript(f"BEGIN;\n{script}\nCOMMIT;")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
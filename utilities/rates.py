@@ -1,5 +1,23 @@
 # rates.py
-PAY_RATE_TABLE = {
-    "staples cashier": 17.80,
-    "staples copy center": 18.50
-}
\ No newline at end of file
+from datetime import date
+
+# every rate type's pay rates as (first day, hourly rate), oldest first
+# each rate applies from its first day until the next one starts (date.min: since always)
+# a raise is one more entry, the shifts before it keep their old rate
+# these only fill a new database: after that its pay_rates table is where the rates are kept
+# (ShiftStore.set_pay_rate adds a raise to it)
+PAY_RATE_HISTORY = {
+    "staples cashier": [
+        (date.min, 17.80),
+    ],
+    "staples copy center": [
+        (date.min, 18.50),
+    ],
+}
+
+# the rates in effect today
+PAY_RATE_TABLE = {rateType: rates[-1][1] for rateType, rates in PAY_RATE_HISTORY.items()}
+
+# pay periods are PAY_PERIOD_DAYS long, counted from the first day of any one of them
+PAY_PERIOD_ANCHOR = date(2025, 1, 5)
+PAY_PERIOD_DAYS = 14
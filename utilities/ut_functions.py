@@ -135,7 +135,12 @@ def toStringCSV(df):
     # printTypes(df)        
 
     for col in df.columns:
-        if pd.api.types.is_object_dtype(df[col]):
+        if pd.api.types.is_timedelta64_dtype(df[col]):
+            minutes = timeColumnToMinutes(df[col])
+            df[col] = [f"{int(m) // 60:02d}:{int(m) % 60:02d}" if not np.isnan(m) else '' for m in minutes]
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%d").fillna('')
+        elif pd.api.types.is_object_dtype(df[col]):
             sample = df[col].dropna().iloc[0] if not df[col].dropna().empty else None
             if isinstance(sample, time):
                 df[col] = df[col].apply(lambda t: t.strftime("%H:%M") if pd.notna(t) else '')
@@ -143,3 +148,52 @@ def toStringCSV(df):
                 df[col] = df[col].apply(lambda d: d.strftime("%Y-%m-%d") if pd.notna(d) else '')
 
     return df
+
+
+
+
+
+
+
+
+
+
+
+
+def timeColumnToMinutes(col: pd.Series) -> np.ndarray:
+    """
+    Turn a column of times into minutes since midnight (float, NaN where blank).
+    Works on timedelta, datetime and plain datetime.time columns.
+    """
+
+    if pd.api.types.is_timedelta64_dtype(col):
+        return (col.dt.total_seconds() // 60).to_numpy(dtype=np.float64)
+
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return (col.dt.hour * 60 + col.dt.minute).to_numpy(dtype=np.float64)
+
+    return np.array(
+        [t.hour * 60 + t.minute if isinstance(t, (time, datetime)) and not pd.isna(t) else np.nan for t in col],
+        dtype=np.float64,
+    )
+
+
+
+
+
+
+def dateColumnToEpochDays(col: pd.Series) -> np.ndarray:
+    """
+    Turn a column of dates into days since 1970-01-01 (float, NaN where blank).
+    Works on datetime columns and plain datetime.date columns.
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(col):
+        days = col.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+        return np.where(np.isnat(days), np.nan, days.astype(np.int64))
+
+    epochOrdinal = date(1970, 1, 1).toordinal()
+    return np.array(
+        [d.toordinal() - epochOrdinal if isinstance(d, date) and not pd.isna(d) else np.nan for d in col],
+        dtype=np.float64,
+    )